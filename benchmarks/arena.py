@@ -0,0 +1,37 @@
+"""Память на узел: CTree против CTreeArena.
+
+Разбирается несколько похожих конфигураций (как история одного устройства или парк однотипных
+устройств) и замеряется, сколько памяти занимают загруженные деревья.
+
+    PYTHONPATH=. python benchmarks/arena.py
+"""
+
+import gc
+import tracemalloc
+from typing import Callable
+
+from benchmarks.common import get_config
+from ctreepo import CTreeParser, Vendor
+
+
+def measure(load: Callable[[str], object], configs: list[str]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    trees = [load(config) for config in configs]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del trees
+    return size
+
+
+if __name__ == "__main__":
+    parser = CTreeParser(Vendor.HUAWEI)
+    configs = [get_config(2_000, seed) for seed in range(10)]
+    nodes = sum(len(parser.parse_arena(config)) for config in configs)
+    ctree = measure(parser.parse, configs)
+    arena = measure(parser.parse_arena, configs)
+    print(f"узлов: {nodes:,}")
+    print(f"CTree:      {ctree / nodes:>8.1f} байт/узел")
+    print(f"CTreeArena: {arena / nodes:>8.1f} байт/узел")
+    print(f"уменьшение: {ctree / arena:>8.1f}x")
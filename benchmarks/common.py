@@ -0,0 +1,42 @@
+"""Общие данные бенчмарков: правила тегирования и генератор конфигураций однотипных устройств.
+
+Модуль не запускается сам, скрипты импортируют его как benchmarks.common.
+"""
+
+import random
+
+from ctreepo import CTree, CTreeSerializer, Vendor
+
+TAGGING_RULES: dict[Vendor, list[dict[str, str | list[str]]]] = {
+    Vendor.HUAWEI: [
+        {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+        {"regex": r"^interface \S+ / port .*", "tags": ["interface", "l2"]},
+        {"regex": r"^interface \S+ / description .*", "tags": ["interface", "description"]},
+        {"regex": r"^acl number (\S+)", "tags": ["acl"]},
+    ],
+}
+
+
+def get_config(count: int, seed: int) -> str:
+    rnd = random.Random(seed)
+    lines = []
+    for indx in range(count):
+        lines.extend(
+            [
+                f"interface 25GE1/0/{indx}",
+                " port link-type trunk",
+                f" description {rnd.choice(['uplink', 'server', 'storage', 'mgmt'])}",
+                f" port trunk allow-pass vlan {rnd.randint(1, 100)}",
+                " undo shutdown",
+                "#",
+            ]
+        )
+    lines.append("acl number 3000")
+    for indx in range(count // 10):
+        lines.append(f" rule {indx * 5} permit ip source 10.{seed}.{indx % 250}.0 0.0.0.255")
+    lines.append("#")
+    return "\n".join(lines)
+
+
+def count_nodes(root: CTree) -> int:
+    return len(CTreeSerializer.to_records(root))
@@ -0,0 +1,52 @@
+"""Время и число создаваемых узлов при вычислении diff'a.
+
+Конфигурации из benchmarks/common.py, целевая отличается от текущей почти в каждом
+интерфейсе, что дает тысячи строк в diff'e. Число узлов считается по вызовам
+CTree.__init__, пиковая память через tracemalloc.
+
+    PYTHONPATH=. python benchmarks/diff.py
+"""
+
+import time
+import tracemalloc
+from typing import Any
+
+from benchmarks.common import get_config
+from ctreepo import CTree, CTreeDiffer, CTreeParser, Vendor
+
+CREATED = 0
+
+
+def count_nodes() -> None:
+    init = CTree.__init__
+
+    def counted(self: CTree, *args: Any, **kwargs: Any) -> None:
+        global CREATED
+        CREATED += 1
+        init(self, *args, **kwargs)
+
+    CTree.__init__ = counted  # type: ignore[method-assign]
+
+
+def measure(a: CTree, b: CTree) -> tuple[float, int, int, int]:
+    global CREATED
+    CREATED = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    diff = CTreeDiffer.diff(a, b)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, CREATED, peak, len(diff.config.splitlines())
+
+
+if __name__ == "__main__":
+    parser = CTreeParser(Vendor.HUAWEI)
+    count_nodes()
+    print(f"{'интерфейсов':>12} {'строк diff':>11} {'время, с':>9} {'узлов':>9} {'пик памяти, КБ':>15}")
+    for count in (1_000, 5_000, 10_000):
+        a = parser.parse(get_config(count, seed=1))
+        b = parser.parse(get_config(count, seed=2))
+        _ = a.content_hash, b.content_hash
+        elapsed, created, peak, lines = measure(a, b)
+        print(f"{count:>12} {lines:>11} {elapsed:>9.3f} {created:>9,} {peak // 1024:>15,}")
@@ -0,0 +1,30 @@
+"""Память на узел CTree при одновременной загрузке многих конфигураций.
+
+Конфигурации однотипных устройств: большая часть строк и наборов тегов совпадает,
+уникальны только описания, vlan и адреса. Память замеряется через tracemalloc
+для деревьев, которые держатся в памяти одновременно.
+
+    PYTHONPATH=. python benchmarks/memory.py
+"""
+
+import gc
+import tracemalloc
+
+from benchmarks.common import TAGGING_RULES, count_nodes, get_config
+from ctreepo import CTreeParser, TaggingRulesDict, Vendor
+
+if __name__ == "__main__":
+    parser = CTreeParser(Vendor.HUAWEI, tagging_rules=TaggingRulesDict(TAGGING_RULES))
+    configs = [get_config(1_000, seed) for seed in range(20)]
+    nodes = sum(count_nodes(parser.parse(config)) for config in configs)
+    distinct = len({line.strip() for config in configs for line in config.splitlines()})
+
+    gc.collect()
+    tracemalloc.start()
+    trees = [parser.parse(config) for config in configs]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"деревьев: {len(trees)}, узлов: {nodes:,}, уникальных строк: {distinct:,}")
+    print(f"память: {size / 1024 / 1024:.1f} МБ, {size / nodes:.1f} байт/узел")
@@ -0,0 +1,69 @@
+"""Скорость поиска по тегам на наборе конфигураций.
+
+Конфигурации и правила тегирования те же, что в benchmarks/common.py. Каждый запрос
+выполняется обходом дерева, по обратному индексу тегов (tag_index=True) и с результатом
+в виде view без копирования узлов (view=True). Отдельно: пакет из BATCH запросов через
+search в цикле (с аргументами и со скомпилированными CTreeQuery) и через search_many
+за один обход.
+
+    PYTHONPATH=. python benchmarks/search.py
+"""
+
+import time
+from typing import Any
+
+from benchmarks.common import TAGGING_RULES, get_config
+from ctreepo import CTreeEnv, CTreeQuery, Vendor
+
+QUERIES: list[dict[str, Any]] = [
+    {"include_tags": ["acl"]},
+    {"include_tags": ["interface", "description"], "include_mode": "and"},
+    {"include_tags": ["l2"], "exclude_tags": ["description"]},
+    {"include_tags": ["not-exists"]},
+]
+
+BATCH: list[dict[str, Any]] = [
+    *QUERIES,
+    *({"string": f"allow-pass vlan {vlan}$"} for vlan in range(1, 21)),
+    *({"string": f"description {role}", "include_tags": ["description"]} for role in ("uplink", "server", "mgmt")),
+    {"string": "shutdown", "exclude_tags": ["l2"]},
+    {"string": r"permit ip source 10\.\d+\.1\d\.", "include_children": True},
+    {"string": "^interface", "include_children": True},
+]
+
+
+if __name__ == "__main__":
+    configs = [get_config(1_000, seed) for seed in range(20)]
+    for tag_index, view in ((False, False), (True, False), (False, True)):
+        print(f"tag_index={tag_index} view={view}")
+        env = CTreeEnv(Vendor.HUAWEI, tagging_rules=TAGGING_RULES[Vendor.HUAWEI], tag_index=tag_index)
+        trees = [env.parse(config) for config in configs]
+        for query in QUERIES:
+            start = time.perf_counter()
+            for tree in trees:
+                if view:
+                    _ = env.search(tree, view=True, **query).config
+                else:
+                    _ = env.search(tree, **query).config
+            elapsed = time.perf_counter() - start
+            print(f"  {str(query):<80} {elapsed / len(trees) * 1000:>8.2f} мс/дерево")
+
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=TAGGING_RULES[Vendor.HUAWEI])
+    trees = [env.parse(config) for config in configs]
+    print(f"пакет из {len(BATCH)} запросов, view=True")
+    start = time.perf_counter()
+    for tree in trees:
+        batch_configs = [env.search(tree, view=True, **query).config for query in BATCH]
+    elapsed = time.perf_counter() - start
+    print(f"  {'search в цикле':<80} {elapsed / len(trees) * 1000:>8.2f} мс/дерево")
+    compiled = [CTreeQuery.compile(**query) for query in BATCH]
+    start = time.perf_counter()
+    for tree in trees:
+        batch_configs = [env.search(tree, query, view=True).config for query in compiled]
+    elapsed = time.perf_counter() - start
+    print(f"  {'search в цикле, CTreeQuery':<80} {elapsed / len(trees) * 1000:>8.2f} мс/дерево")
+    start = time.perf_counter()
+    for tree in trees:
+        batch_configs = [view.config for view in env.search_many(tree, BATCH, view=True)]
+    elapsed = time.perf_counter() - start
+    print(f"  {'search_many':<80} {elapsed / len(trees) * 1000:>8.2f} мс/дерево")
@@ -0,0 +1,93 @@
+"""Скорость сериализации деревьев в словари и обратно.
+
+Сценарий кеша снимков: деревья сохраняются в JSON через to_dict и восстанавливаются
+через from_dict, для сравнения - повторный разбор исходного текста конфигураций и
+бинарный формат dump/load (без сжатия и с gzip). Для снимков в файлах - чтение двух секций
+через open_snapshot (mmap, узлы читаются по мере обращения) против полной загрузки.
+
+    PYTHONPATH=. python benchmarks/serializer.py
+"""
+
+import gzip
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.common import TAGGING_RULES, count_nodes, get_config
+from ctreepo import CTree, CTreeEnv, CTreeSerializer, Vendor
+
+
+def measure(name: str, func: Callable[[], object], nodes: int, repeat: int = 5) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _ = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<30} {best * 1000:>8.1f} мс {best / nodes * 1e9:>8.0f} нс/узел")
+
+
+if __name__ == "__main__":
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=TAGGING_RULES[Vendor.HUAWEI])
+    configs = [get_config(500, seed) for seed in range(40)]
+    trees = [env.parse(config) for config in configs]
+    nodes = sum(count_nodes(tree) for tree in trees)
+    snapshot = json.dumps([CTreeSerializer.to_dict(tree) for tree in trees])
+    data = json.loads(snapshot)
+    print(f"деревьев: {len(trees)}, узлов: {nodes}")
+
+    measure("parse", lambda: [env.parse(config) for config in configs], nodes)
+    measure("to_dict", lambda: [CTreeSerializer.to_dict(tree) for tree in trees], nodes)
+    measure("from_dict", lambda: [CTreeSerializer.from_dict(Vendor.HUAWEI, item) for item in data], nodes)
+    measure("json.loads + from_dict", lambda: [env.from_dict(item) for item in json.loads(snapshot)], nodes)
+
+    dumps: dict[str | None, list[bytes]] = {}
+    for compression in (None, "gzip"):
+        dumps[compression] = []
+        for tree in trees:
+            fp = io.BytesIO()
+            CTreeSerializer.dump(tree, fp, compression=compression)  # type: ignore[arg-type]
+            dumps[compression].append(fp.getvalue())
+
+    def load_all(items: list[bytes]) -> list[CTree]:
+        return [CTreeSerializer.load(Vendor.HUAWEI, io.BytesIO(item)) for item in items]
+
+    measure("dump", lambda: [CTreeSerializer.dump(tree, io.BytesIO()) for tree in trees], nodes)
+    measure("load", lambda: load_all(dumps[None]), nodes)
+    measure("load gzip", lambda: load_all(dumps["gzip"]), nodes)
+
+    def read_sections(paths: list[Path]) -> list[str]:
+        result = []
+        for path in paths:
+            with env.open_snapshot(path) as snapshot:
+                children = snapshot.root.children
+                result.append(children["interface 25GE1/0/250"].config)
+                result.append(next(node.config for line, node in children.items() if line.startswith("acl ")))
+        return result
+
+    def load_sections(paths: list[Path]) -> list[str]:
+        result = []
+        for path in paths:
+            with open(path, "rb") as fp:
+                children = env.load(fp).children
+            result.append(children["interface 25GE1/0/250"].config)
+            result.append(next(node.config for line, node in children.items() if line.startswith("acl ")))
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for indx, item in enumerate(dumps[None]):
+            paths.append(Path(tmp) / f"{indx}.ctree")
+            paths[-1].write_bytes(item)
+        assert read_sections(paths) == load_sections(paths)
+        measure("load + 2 секции", lambda: load_sections(paths), nodes)
+        measure("open_snapshot + 2 секции", lambda: read_sections(paths), nodes)
+
+    print()
+    print(f"{'json':<30} {len(snapshot) / 1024:>8.1f} КБ")
+    json_gzip = sum(len(gzip.compress(json.dumps(item).encode())) for item in data)
+    print(f"{'json + gzip':<30} {json_gzip / 1024:>8.1f} КБ")
+    print(f"{'dump':<30} {sum(map(len, dumps[None])) / 1024:>8.1f} КБ")
+    print(f"{'dump gzip':<30} {sum(map(len, dumps['gzip'])) / 1024:>8.1f} КБ")
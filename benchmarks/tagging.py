@@ -0,0 +1,96 @@
+"""Пропускная способность расстановки тегов в зависимости от числа правил.
+
+Сравнивается последовательный перебор правил через re.search (как было раньше)
+и CTreeTagger с фильтром по литеральному началу regex.
+
+    PYTHONPATH=. python benchmarks/tagging.py
+"""
+
+import re
+import time
+from typing import Callable
+
+from ctreepo import CTreeTagger, TaggingRule
+
+KEYWORDS = [
+    "interface",
+    "ip vpn-instance",
+    "bgp",
+    "route-policy",
+    "acl number",
+    "ip ip-prefix",
+    "ntp-service",
+    "snmp-agent",
+    "aaa",
+    "radius-server template",
+    "hwtacacs-server template",
+    "xpl route-filter",
+    "ip community-filter",
+    "vlan",
+    "bridge-domain",
+    "evpn vpn-instance",
+    "lldp",
+    "stelnet",
+    "info-center",
+    "user-interface",
+]
+
+
+def get_rules(count: int) -> list[TaggingRule]:
+    rules = []
+    for indx in range(count):
+        keyword = KEYWORDS[indx % len(KEYWORDS)]
+        if indx % 25 == 24:
+            # немного правил без якоря, их фильтр не отсекает
+            rules.append(TaggingRule(regex=rf"{keyword} (\S+) .* rule-{indx}$", tags=[f"tag-{indx}"]))
+        else:
+            rules.append(TaggingRule(regex=rf"^{keyword} (\S+) .* option-{indx}$", tags=[f"tag-{indx}"]))
+    return rules
+
+
+def get_lines(count: int) -> list[str]:
+    lines = []
+    for indx in range(count):
+        keyword = KEYWORDS[indx % len(KEYWORDS)]
+        lines.append(f"{keyword} name-{indx} / option-{indx % 500}")
+    return lines
+
+
+def sequential(rules: list[TaggingRule], lines: list[str]) -> int:
+    matched = 0
+    for line in lines:
+        for rule in rules:
+            if re.search(rule.regex, line):
+                matched += 1
+                break
+    return matched
+
+
+def tagger(rules: list[TaggingRule], lines: list[str]) -> int:
+    engine = CTreeTagger(rules)
+    matched = 0
+    for line in lines:
+        if engine.get_tags(line) is not None:
+            matched += 1
+    return matched
+
+
+def measure(
+    func: Callable[[list[TaggingRule], list[str]], int],
+    rules: list[TaggingRule],
+    lines: list[str],
+) -> tuple[float, int]:
+    start = time.perf_counter()
+    matched = func(rules, lines)
+    return len(lines) / (time.perf_counter() - start), matched
+
+
+if __name__ == "__main__":
+    lines = get_lines(20_000)
+    print(f"{'правил':>8} {'re.search, строк/с':>20} {'CTreeTagger, строк/с':>22} {'ускорение':>10}")
+    for count in (10, 50, 100, 200, 400):
+        rules = get_rules(count)
+        seq_rate, seq_matched = measure(sequential, rules, lines)
+        tagger_rate, tagger_matched = measure(tagger, rules, lines)
+        assert seq_matched == tagger_matched
+        print(f"{count:>8} {seq_rate:>20,.0f} {tagger_rate:>22,.0f} {tagger_rate / seq_rate:>9.1f}x")
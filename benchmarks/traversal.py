@@ -0,0 +1,62 @@
+"""Накладные расходы обхода дерева в пересчете на узел.
+
+Операции над деревьями из benchmarks/common.py (copy, merge, apply, subtract, сравнение,
+rebuild, reorder, formal_config, diff), время в наносекундах на узел дерева. Отдельно
+проверяется дерево глубже sys.getrecursionlimit().
+
+    PYTHONPATH=. python benchmarks/traversal.py
+"""
+
+import sys
+import time
+from typing import Callable
+
+from benchmarks.common import TAGGING_RULES, count_nodes, get_config
+from ctreepo import CTree, CTreeDiffer, CTreeEnv, HuaweiCT, Vendor
+
+
+def get_deep_tree(depth: int) -> CTree:
+    root = HuaweiCT()
+    node = root
+    for indx in range(depth):
+        node = HuaweiCT(f"section {indx}", node)
+    return root
+
+
+def measure(name: str, func: Callable[[], object], nodes: int, repeat: int = 7) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _ = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<30} {best / nodes * 1e9:>10.0f} нс/узел")
+
+
+if __name__ == "__main__":
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=TAGGING_RULES[Vendor.HUAWEI])
+    current = env.parse(get_config(2_000, 0))
+    target = env.parse(get_config(2_000, 1))
+    # в дереве с отличием в конце сравнение доходит до последнего интерфейса
+    changed = current.copy()
+    list(changed.children.values())[-2].children["undo shutdown"].line = "shutdown"
+    nodes = count_nodes(current)
+    print(f"узлов в дереве: {nodes}")
+
+    measure("copy", current.copy, nodes)
+    measure("merge", lambda: current.copy().merge(target), nodes * 2)
+    measure("apply", lambda: current.apply(target), nodes * 2)
+    measure("apply_view", lambda: current.apply_view(target), nodes)
+    measure("subtract", lambda: current.subtract(target), nodes * 2)
+    measure("==", lambda: current == changed, nodes)
+    measure("rebuild(deep=True)", lambda: current.rebuild(deep=True), nodes)
+    measure("reorder", lambda: current.reorder(["acl", "interface"]), nodes)
+    measure("formal_config", lambda: current.formal_config, nodes)
+    measure("diff", lambda: CTreeDiffer.diff(current, target), nodes * 2)
+
+    depth = sys.getrecursionlimit() * 2
+    deep = get_deep_tree(depth)
+    try:
+        deep.copy().merge(deep)
+        print(f"дерево глубиной {depth}: copy/merge выполнены")
+    except RecursionError:
+        print(f"дерево глубиной {depth}: RecursionError")
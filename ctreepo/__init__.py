@@ -1,4 +1,5 @@
 from .abstract import *
+from .arena import *
 from .differ import *
 from .environment import *
 from .factory import *
@@ -10,4 +11,7 @@ from .postproc_cisco import *
 from .postproc_huawei import *
 from .searcher import *
 from .serializer import *
+from .snapshot import *
+from .traversal import *
 from .vendors import *
+from .view import *
@@ -3,12 +3,76 @@ from __future__ import annotations
 import re
 from abc import ABC, abstractmethod
 from collections import deque
+from typing import Any, Callable, Iterable, Iterator, TextIO, Type
+
+from .index import CTreeTagIndex
+from .models import CTreeProfile, TagSet
+from .traversal import iter_preorder
 
 __all__ = ("CTree",)
 
 
+_PROFILES: dict[Type[CTree], CTreeProfile] = {}
+
+
+def _compile_patterns(patterns: list[str]) -> re.Pattern[str] | None:
+    if len(patterns) == 0:
+        return None
+    return re.compile("|".join(patterns))
+
+
+def _tracked(method: Callable[..., Any]) -> Callable[..., Any]:
+    def wrapper(self: _CTreeChildren, *args: Any, **kwargs: Any) -> Any:
+        result = method(self, *args, **kwargs)
+        self._node._children_changed()
+        return result
+
+    return wrapper
+
+
+class _CTreeChildren(dict[str, "CTree"]):
+    """Словарь потомков узла, изменения на месте сбрасывают кеши узла, как присваивание node.children.
+
+    Отслеживаются node.children[...] = ..., del, pop, popitem, setdefault, update, clear и |=.
+    """
+
+    __slots__ = ("_node",)
+
+    _node: CTree
+
+    @classmethod
+    def create(cls, node: CTree, children: dict[str, CTree] | None = None) -> _CTreeChildren:
+        result = cls() if children is None else cls(children)
+        result._node = node
+        return result
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # pickle/deepcopy по умолчанию заполняют словарь через __setitem__ до восстановления _node
+        return self.__class__, (dict(self),), (None, {"_node": self._node})
+
+    __setitem__ = _tracked(dict.__setitem__)
+    __delitem__ = _tracked(dict.__delitem__)
+    __ior__ = _tracked(dict.__ior__)  # type: ignore[assignment]
+    pop = _tracked(dict.pop)
+    popitem = _tracked(dict.popitem)
+    setdefault = _tracked(dict.setdefault)
+    update = _tracked(dict.update)
+    clear = _tracked(dict.clear)
+
+
 class CTree(ABC):
-    __slots__ = ["line", "parent", "children", "tags"]
+    __slots__ = [
+        "_line",
+        "_parent",
+        "_children",
+        "_tags",
+        "_path",
+        "_path_str",
+        "_content_hash",
+        "_masked_index",
+        "_masked_line",
+        "_tag_index",
+    ]
 
     @property
     @abstractmethod
@@ -62,30 +126,220 @@ class CTree(ABC):
     # empty_section_placeholder = "<-empty-section->"
 
     def __init__(self, line: str = "", parent: CTree | None = None, tags: list[str] | None = None) -> None:
-        self.line = line.strip()
+        self._line = line.strip()
 
         # pattern = "|".join(self.mask_lines)
         # self.masked_line = re.sub(rf"({pattern}) \S+", rf"\1 {self.mask_pattern}", self.line)
 
-        self.parent = parent
-        self.children: dict[str, CTree] = {}
+        self._parent = parent
+        self._path: tuple[str, ...] | None = None
+        self._path_str: str | None = None
+        self._content_hash: int | None = None
+        self._masked_index: dict[str, str] | None = None
+        self._masked_line: str | None = None
+        # индекс тегов дерева, общий для всех узлов (см. enable_tag_index), у дерева без индекса - None
+        self._tag_index: CTreeTagIndex | None = None if parent is None else parent._tag_index
+        # словарь создается для каждого узла, поэтому без вызова create
+        children = _CTreeChildren()
+        children._node = self
+        self._children: dict[str, CTree] = children
 
         if tags is not None:
-            self.tags = tags
+            self._tags = tags
         elif parent is not None:
-            self.tags = parent.tags
+            self._tags = parent._tags
         else:
-            self.tags = []
+            self._tags = []
 
         if parent is not None:
-            parent.children[line.strip()] = self
+            # кеши родителя сбрасываются здесь же, поэтому отслеживание изменений children не нужно
+            dict.__setitem__(parent._children, self._line, self)
+            parent._masked_index = None
+            parent._reset_content_hash()
+            if self._tag_index is not None:
+                self._tag_index.invalidate()
+
+    @property
+    def line(self) -> str:
+        return self._line
+
+    @line.setter
+    def line(self, line: str) -> None:
+        self._line = line
+        self._masked_line = None
+        if self._parent is not None:
+            self._parent._masked_index = None
+        self._reset_path()
+        self._reset_content_hash()
+
+    @property
+    def children(self) -> dict[str, CTree]:
+        return self._children
+
+    @children.setter
+    def children(self, children: dict[str, CTree]) -> None:
+        self._children = _CTreeChildren.create(self, children)
+        self._children_changed()
+
+    def _children_changed(self) -> None:
+        """Сброс кешей узла, которые зависят от потомков, при замене или изменении children на месте."""
+        self._masked_index = None
+        self._reset_content_hash()
+        self._reset_tag_index()
+
+    @property
+    def tags(self) -> list[str]:
+        """Теги узла, общий неизменяемый TagSet при первом обращении заменяется изменяемой копией.
+
+        Список тегов могут изменить на месте, поэтому обращение сбрасывает кеши и индекс тегов,
+        как присваивание. Внутренний код читает _tags напрямую, чтобы не терять общие наборы тегов и кеши.
+        """
+        tags = self._tags
+        if isinstance(tags, TagSet):
+            tags = self._tags = tags.copy()
+        self._reset_content_hash()
+        self._reset_tag_index()
+        return tags
+
+    @tags.setter
+    def tags(self, tags: list[str]) -> None:
+        self._tags = tags
+        self._reset_content_hash()
+        self._reset_tag_index()
+
+    @property
+    def parent(self) -> CTree | None:
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent: CTree | None) -> None:
+        # сбрасывается индекс дерева, из которого узел уходит, и дерева, в которое он попадает
+        self._reset_tag_index()
+        if parent is not None and parent._tag_index is not self._tag_index:
+            parent._reset_tag_index()
+        self._parent = parent
+        self._reset_path()
+
+    @property
+    def tag_index(self) -> CTreeTagIndex | None:
+        """Обратный индекс тегов дерева, если он включен (см. enable_tag_index)."""
+        node = self
+        while node._parent is not None:
+            node = node._parent
+        index = node._tag_index
+        # у отсоединенного поддерева может остаться ссылка на индекс прежнего дерева
+        if index is None or index.root is not node:
+            return None
+        return index
+
+    def enable_tag_index(self) -> CTreeTagIndex:
+        """Подключение обратного индекса тегов к корню дерева, CTreeSearcher использует его при поиске по тегам.
+
+        Индекс строится сразу, при изменении дерева сбрасывается и перестраивается при следующем поиске.
+        """
+        node = self
+        while node._parent is not None:
+            node = node._parent
+        index = node.tag_index
+        if index is None:
+            index = CTreeTagIndex(node)
+        _ = index.get("")
+        return index
+
+    def _reset_tag_index(self) -> None:
+        # ссылка на индекс есть у каждого узла индексированного дерева, до корня идти не нужно
+        if self._tag_index is not None:
+            self._tag_index.invalidate()
+
+    def _reset_path(self) -> None:
+        """Сброс закешированного formal path у узла и его потомков.
+
+        Путь потомка вычисляется через путь родителя, поэтому если у узла кеша нет,
+        то и у его потомков его быть не может, дальше не спускаемся.
+        """
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node._path is None:
+                continue
+            node._path = None
+            node._path_str = None
+            stack.extend(node.children.values())
+
+    def _reset_content_hash(self) -> None:
+        """Сброс закешированного content_hash у узла и его предков.
+
+        Хеш предка вычисляется через хеши потомков, поэтому если у узла кеша нет,
+        то и у предков его нет.
+        """
+        node: CTree | None = self
+        while node is not None and node._content_hash is not None:
+            node._content_hash = None
+            node = node._parent
+
+    @property
+    def _masked_children(self) -> dict[str, str]:
+        """Индекс masked_line -> line потомков (первое вхождение), кешируется до изменения потомков."""
+        if self._masked_index is None:
+            index: dict[str, str] = {}
+            for line, node in self._children.items():
+                _ = index.setdefault(node.masked_line, line)
+            self._masked_index = index
+        return self._masked_index
+
+    @property
+    def content_hash(self) -> int:
+        """Хеш содержимого поддерева: строка, набор тегов и хеши потомков с учетом порядка.
+
+        Вычисляется лениво и кешируется, кеш сбрасывается при любом изменении узла или его потомков:
+        присваивании line/tags/children, изменении словаря children на месте, обращении к tags (список
+        могут изменить на месте), создании и удалении узлов. Хеш 64-битный, равные хеши не доказывают
+        равенство поддеревьев, поэтому используется только в differ для пропуска одинаковых секций,
+        а не в __eq__.
+        """
+        if self._content_hash is not None:
+            return self._content_hash
+        stack: list[tuple[CTree, bool]] = [(self, False)]
+        while len(stack) > 0:
+            node, children_ready = stack.pop()
+            if node._content_hash is not None:
+                continue
+            if not children_ready:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node._children.values() if child._content_hash is None)
+                continue
+            node._content_hash = hash(
+                (
+                    node._line,
+                    frozenset(node._tags),
+                    *[child._content_hash for child in node._children.values()],
+                )
+            )
+        return self._content_hash  # type: ignore[return-value]
+
+    @classmethod
+    def get_profile(cls) -> CTreeProfile:
+        """Скомпилированные паттерны класса: junk, mask, секции с/без exit.
+
+        Строятся один раз на класс (вендора) при первом обращении.
+        """
+        profile = _PROFILES.get(cls)
+        if profile is None:
+            profile = CTreeProfile(
+                junk_lines=_compile_patterns(cls.junk_lines),  # type: ignore[arg-type]
+                mask_patterns=_compile_patterns(cls.mask_patterns),  # type: ignore[arg-type]
+                sections_without_exit=_compile_patterns(cls.sections_without_exit),  # type: ignore[arg-type]
+                sections_require_exit=_compile_patterns(cls.sections_require_exit),  # type: ignore[arg-type]
+            )
+            _PROFILES[cls] = profile
+        return profile
 
     @classmethod
     def mask_line(cls, line: str) -> str:
-        # if len(cls.mask_patterns) == 0:
-        #     return line
-        pattern = "|".join(cls.mask_patterns)  # type: ignore [arg-type]
-        if (m := re.fullmatch(pattern, line)) is not None:
+        pattern = cls.get_profile().mask_patterns
+        if pattern is None:
+            return line
+        if (m := pattern.fullmatch(line)) is not None:
             secret = [g for g in m.groups() if g is not None][0]
             return line.replace(secret, cls.masking_string)
         else:
@@ -95,7 +349,10 @@ class CTree(ABC):
 
     @property
     def masked_line(self) -> str:
-        return self.mask_line(self.line)
+        """Строка с замаскированными секретами, кешируется до изменения line."""
+        if self._masked_line is None:
+            self._masked_line = self.mask_line(self._line)
+        return self._masked_line
 
     def __str__(self) -> str:
         """строковое представление: сама строка или 'root', если для корня вызываем."""
@@ -113,6 +370,10 @@ class CTree(ABC):
             to_delete.append(node)
             if len(node.children) != 0:
                 stack.extendleft(list(node.children.values())[::-1])
+        if self.parent is not None:
+            self.parent._masked_index = None
+            self.parent._reset_content_hash()
+            self.parent._reset_tag_index()
         for node in to_delete[::-1]:
             if node.parent is not None:
                 _ = node.parent.children.pop(node.line)
@@ -151,132 +412,184 @@ class CTree(ABC):
         if self_parents != other_parents:
             return False
 
-        if set(self.tags) != set(other.tags):
-            return False
-
-        children_eq = []
-        for line, node in self.children.items():
-            other_node = other.children.get(line)
-            if other_node is None:
+        # пути у потомков совпадают, если совпали пути родителей и строки, поэтому дальше
+        # сравниваются только строки, теги и потомки
+        stack = [(self, other)]
+        while len(stack) > 0:
+            node, other_node = stack.pop()
+            if len(node._children) != len(other_node._children):
+                return False
+            if set(node._tags) != set(other_node._tags):
                 return False
-            children_eq.append(node == other_node)
-        return all(children_eq)
+            # content_hash здесь не используется: он учитывает порядок потомков, а сравнение нет,
+            # и совпадение хешей не гарантирует совпадения поддеревьев
+            for line, child in node._children.items():
+                other_child = other_node._children.get(line)
+                if other_child is None:
+                    return False
+                stack.append((child, other_child))
+        return True
+
+    @property
+    def _path_tuple(self) -> tuple[str, ...]:
+        """Строки от корня до узла (без корня), кешируется до изменения line/parent."""
+        path = self._path
+        if path is None:
+            # поднимаемся до узла с готовым путем (или до корня), затем заполняем пути вниз
+            chain: list[CTree] = []
+            node: CTree | None = self
+            while node is not None and node._path is None:
+                chain.append(node)
+                node = node._parent
+            path = () if node is None or node._path is None else node._path
+            for current in reversed(chain):
+                path = (*path, current._line) if current._parent is not None else ()
+                current._path = path
+        return path
 
     @property
     def _formal_path(self) -> list[str]:
-        result = []
-        node = self
-        while node.parent is not None:
-            result.append(node.line)
-            node = node.parent
-        result.reverse()
-        return result
+        return list(self._path_tuple)
 
     @property
     def formal_path(self) -> str:
-        return " / ".join(self._formal_path)
-
-    def _config(self, symbol: str, level: int, masked: bool) -> list[str]:
-        line = self.masked_line if masked else self.line
-        # if line == self.empty_section_placeholder:
-        #     return []
-        result = [symbol * level + line]
-        for child in self.children.values():
-            result.extend(child._config(symbol=symbol, level=level + 1, masked=masked))
-        return result
+        if self._path_str is None:
+            self._path_str = " / ".join(self._path_tuple)
+        return self._path_str
 
-    def _build_config(self, masked: bool) -> str:
-        result = []
-        level = 0
+    def _iter_config(self, masked: bool) -> Iterator[str]:
+        """Строки конфигурации в порядке вывода, без промежуточных списков на каждом уровне."""
+        path_to_root = []
         node = self
         while node.parent is not None:
-            result.append(node.masked_line if masked else node.line)
-            level += 1
+            path_to_root.append(node.masked_line if masked else node.line)
             node = node.parent
-        result.reverse()
-        result = [self.spaces * indx + line for indx, line in enumerate(result)]
+        path_to_root.reverse()
+        for indx, line in enumerate(path_to_root):
+            yield self.spaces * indx + line
+
+        # на каждом уровне стек хранит итератор по потомкам, отступы переиспользуются
+        base = len(path_to_root)
+        indents = [self.spaces * indx for indx in range(base + 1)]
         for child in self.children.values():
-            result.extend(child._config(symbol=self.spaces, level=level, masked=masked))
+            yield indents[base] + (child.masked_line if masked else child._line)
+            stack = [iter(child._children.values())]
+            while len(stack) > 0:
+                current = next(stack[-1], None)
+                if current is None:
+                    _ = stack.pop()
+                    continue
+                level = base + len(stack)
+                if level == len(indents):
+                    indents.append(self.spaces * level)
+                yield indents[level] + (current.masked_line if masked else current._line)
+                if len(current._children) != 0:
+                    stack.append(iter(current._children.values()))
             if self.parent is None:
-                result.append(self.section_separator)
-        return "\n".join(result)
+                yield self.section_separator
+
+    @staticmethod
+    def _write_lines(fp: TextIO, lines: Iterator[str]) -> None:
+        line = next(lines, None)
+        if line is None:
+            return
+        _ = fp.write(line)
+        for line in lines:
+            _ = fp.write("\n")
+            _ = fp.write(line)
+
+    def write_config(self, fp: TextIO, masked: bool = False) -> None:
+        """Запись конфигурации в fp построчно, результат совпадает с config/masked_config."""
+        self._write_lines(fp, self._iter_config(masked))
 
     @property
     def config(self) -> str:
-        return self._build_config(masked=False)
+        return "\n".join(self._iter_config(masked=False))
 
     @property
     def masked_config(self) -> str:
-        return self._build_config(masked=True)
+        return "\n".join(self._iter_config(masked=True))
 
     @property
     def _formal_config(self) -> list[list[str]]:
-        result = []
-        for node in self.children.values():
-            if len(node.children) == 0:
-                result.append(node._formal_path)
-            else:
-                result.extend(node._formal_config)
-        return result
+        return [node._formal_path for node, _ in iter_preorder(self, include_root=False) if len(node._children) == 0]
 
     @property
     def formal_config(self) -> str:
-        result = []
-
-        node = self
         if len(self.children) == 0:
             return self.formal_path
-        for node in self.children.values():
-            if len(node.children) == 0:
-                result.append(node._formal_path)
-            else:
-                result.extend(node._formal_config)
+        return "\n".join([" / ".join(config) for config in self._formal_config])
 
-        return "\n".join([" / ".join(config) for config in result])
+    def _iter_patch(self, masked: bool) -> Iterator[str]:
+        """Строки patch'a в порядке вывода.
 
-    def _build_patch(self, masked: bool) -> str:
-        nodes = deque(self.children.values())
-        result = []
-        path_to_root = []
+        Путь узла для проверки sections_without_exit/sections_require_exit собирается по ходу обхода,
+        exit секций выводится без создания узлов.
+        """
+        profile = self.get_profile()
+        without_exit = profile.sections_without_exit
+        require_exit = profile.sections_require_exit
 
+        path_to_root = []
         node = self
         while node.parent is not None:
             path_to_root.append(node.masked_line if masked else node.line)
             node = node.parent
         path_to_root.reverse()
+        yield from path_to_root
 
-        while len(nodes) > 0:
-            node = nodes.popleft()
-            # if node.line == node.empty_section_placeholder:
-            #     continue
-            result.append(node.masked_line if masked else node.line)
-            if len(node.children) != 0:
-                if not re.fullmatch("|".join(self.sections_without_exit), node.formal_path):
-                    nodes.appendleft(self.__class__(line=self.section_exit))
-                nodes.extendleft(list(node.children.values())[::-1])
-            elif len(self.sections_require_exit) != 0 and re.fullmatch(
-                "|".join(self.sections_require_exit), node.formal_path
-            ):
-                nodes.appendleft(self.__class__(line=self.section_exit))
-        result = path_to_root + result + [self.section_exit] * len(path_to_root)
-        return "\n".join(result)
+        # элемент стека: итератор по потомкам, formal_path их родителя и нужен ли exit после них
+        stack = [(iter(self._children.values()), self.formal_path if self.parent is not None else None, False)]
+        while len(stack) > 0:
+            children, parent_path, need_exit = stack[-1]
+            current = next(children, None)
+            if current is None:
+                _ = stack.pop()
+                if need_exit:
+                    yield self.section_exit
+                continue
+            yield current.masked_line if masked else current._line
+            path = current._line if parent_path is None else f"{parent_path} / {current._line}"
+            if len(current._children) != 0:
+                need_exit = without_exit is None or not without_exit.fullmatch(path)
+                stack.append((iter(current._children.values()), path, need_exit))
+            elif require_exit is not None and require_exit.fullmatch(path):
+                yield self.section_exit
+        for _ in path_to_root:
+            yield self.section_exit
+
+    def write_patch(self, fp: TextIO, masked: bool = False) -> None:
+        """Запись patch'a в fp построчно, результат совпадает с patch/masked_patch."""
+        self._write_lines(fp, self._iter_patch(masked))
 
     @property
     def patch(self) -> str:
-        return self._build_patch(masked=False)
+        return "\n".join(self._iter_patch(masked=False))
 
     @property
     def masked_patch(self) -> str:
-        return self._build_patch(masked=True)
+        return "\n".join(self._iter_patch(masked=True))
 
     def _copy(self, children: bool, parent: CTree | None) -> CTree:
         if self.parent is not None and parent is None:
-            parent = self.parent._copy(children=False, parent=None)
-
-        new_obj = self.__class__(line=self.line, parent=parent, tags=self.tags.copy())
+            # цепочка предков копируется без потомков
+            chain = []
+            ancestor: CTree | None = self.parent
+            while ancestor is not None:
+                chain.append(ancestor)
+                ancestor = ancestor.parent
+            for node in reversed(chain):
+                parent = node.__class__(line=node.line, parent=parent, tags=node._tags.copy())
+
+        new_obj = self.__class__(line=self.line, parent=parent, tags=self._tags.copy())
         if children:
-            for child in self.children.values():
-                _ = child._copy(children, new_obj)
+            stack = [(self, new_obj)]
+            while len(stack) > 0:
+                node, new_node = stack.pop()
+                for child in node._children.values():
+                    new_child = child.__class__(line=child._line, parent=new_node, tags=child._tags.copy())
+                    if len(child._children) != 0:
+                        stack.append((child, new_child))
         return new_obj
 
     def copy(self, children: bool = True) -> CTree:
@@ -286,23 +599,32 @@ class CTree(ABC):
         return root
 
     def merge(self, other: CTree) -> None:
-        for line, node in other.children.items():
-            if line not in self.children:
-                _ = node._copy(children=True, parent=self)
-            else:
-                self.children[line].merge(node)
+        stack = [(self, other)]
+        while len(stack) > 0:
+            node, other_node = stack.pop()
+            for line, other_child in other_node.children.items():
+                child = node.children.get(line)
+                if child is None:
+                    _ = other_child._copy(children=True, parent=node)
+                else:
+                    stack.append((child, other_child))
 
     def _subtract(self, other: CTree, masked: bool = False) -> None:
-        nodes_to_delete = []
-        for child in self.children.values():
-            line = child.exists_in(other, masked)
-            if len(line) != 0:
-                if len(child.children) != 0:
-                    child._subtract(other.children[line])
-                if len(child.children) == 0:
-                    nodes_to_delete.append(child)
-        for node in nodes_to_delete:
-            node.delete()
+        # найденные в other узлы собираются сверху вниз, а удаляются в обратном порядке: узел
+        # удаляется, если после вычитания у него не осталось потомков (masked - только первый уровень)
+        found = []
+        stack = [(self, other, masked)]
+        while len(stack) > 0:
+            node, other_node, node_masked = stack.pop()
+            for child in node.children.values():
+                line = child.exists_in(other_node, node_masked)
+                if len(line) != 0:
+                    found.append(child)
+                    if len(child.children) != 0:
+                        stack.append((child, other_node.children[line], False))
+        for child in reversed(found):
+            if len(child.children) == 0:
+                child.delete()
 
     def subtract(self, other: CTree) -> CTree:
         result = self.copy()
@@ -310,35 +632,61 @@ class CTree(ABC):
         return result
 
     def _apply(self, other: CTree) -> None:
-        for child in other.children.values():
-            if child.line.startswith(child.undo):
-                line = child.line.replace(child.undo, "").strip()
-                if line in self.children:
-                    self.children[line].delete()
-            else:
-                if child.exists_in(self):
-                    self.children[child.line]._apply(other=child)
+        stack = [(self, other)]
+        while len(stack) > 0:
+            node, other_node = stack.pop()
+            for child in other_node.children.values():
+                if child.line.startswith(child.undo):
+                    line = child.line.replace(child.undo, "").strip()
+                    if line in node.children:
+                        node.children[line].delete()
+                elif child.exists_in(node):
+                    stack.append((node.children[child.line], child))
                 else:
-                    child._copy(children=True, parent=self)
+                    child._copy(children=True, parent=node)
 
     def apply(self, other: CTree) -> CTree:
         result = self.copy()
         result._apply(other=other)
         return result
 
+    def _get_view(self, parent: CTree | None) -> CTree:
+        view = self.__class__(line=self.line, parent=parent, tags=self._tags)
+        view.children = dict(self.children)
+        return view
+
+    def apply_view(self, other: CTree) -> CTree:
+        """Результат apply для корня дерева без копирования всего дерева.
+
+        Новые узлы создаются только вдоль путей, которые затрагивает other, остальные
+        поддеревья (и узлы из other) берутся как есть, поэтому результат только для чтения:
+        его изменение затронет исходные деревья.
+        """
+        root = self._get_view(parent=None)
+        stack = [(root, other)]
+        while len(stack) > 0:
+            view, other_node = stack.pop()
+            for child in other_node.children.values():
+                if child.line.startswith(child.undo):
+                    line = child.line.replace(child.undo, "").strip()
+                    _ = view.children.pop(line, None)
+                elif child.line in view.children:
+                    # узел-view создается сразу (встает на место исходного узла), потомки - позже
+                    stack.append((view.children[child.line]._get_view(parent=view), child))
+                else:
+                    view.children[child.line] = child
+        return root
+
     def rebuild(self, deep: bool = False) -> None:
-        new_children = {child.line: child for child in self.children.values()}
-        self.children = new_children
-        if deep:
-            for child in self.children.values():
-                child.rebuild(deep)
+        if not deep:
+            self.children = {child.line: child for child in self.children.values()}
+            return
+        for node, _ in iter_preorder(self):
+            node.children = {child.line: child for child in node.children.values()}
 
     def exists_in(self, other: CTree, masked: bool = False) -> str:
         if masked:
-            for line, node in other.children.items():
-                if self.masked_line == node.masked_line:
-                    return line
-            return ""
+            return other._masked_children.get(self.masked_line, "")
         else:
             if self.line in other.children:
                 return self.line
@@ -346,12 +694,6 @@ class CTree(ABC):
                 return ""
 
     def reorder(self, tags: list[str], *, reverse: bool = False) -> None:
-        def _get_children_tags(node: CTree) -> list[str]:
-            tags = node.tags.copy()
-            for child in node.children.values():
-                tags.extend(_get_children_tags(child))
-            return list(set(tags))
-
         if len(tags) == 0:
             return
 
@@ -365,22 +707,29 @@ class CTree(ABC):
         children[no_tags] = []
 
         for child in self.children.values():
-            child_tags = _get_children_tags(child)
-            common_tags = set(tags).intersection(set(child_tags))
+            child_tags = {tag for node, _ in iter_preorder(child) for tag in node._tags}
+            common_tags = set(tags).intersection(child_tags)
             if len(common_tags) == 0:
                 children[no_tags].append(child)
             else:
                 tag = common_tags.pop()
                 children[tag].append(child)
 
-        self.children = {}
-        for child_list in children.values():
-            for child in child_list:
-                self.children[child.line] = child
+        self.children = {child.line: child for child_list in children.values() for child in child_list}
 
     @classmethod
     def pre_run(cls, config: str) -> str:
         return config
 
+    @classmethod
+    def pre_run_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        """Построчный аналог pre_run для потокового разбора конфигурации.
+
+        Строки без переводов строки, результат должен совпадать с pre_run для текста из этих строк,
+        соединенных переводом строки. Если конфигурация заканчивается переводом строки, последней
+        идет пустая строка.
+        """
+        yield from lines
+
     def post_run(self) -> None:
         return
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Iterator, Type
+
+from .abstract import CTree
+from .factory import CTreeFactory
+from .models import TagSet, Vendor
+from .traversal import iter_preorder
+
+__all__ = (
+    "CTreeArena",
+    "CTreeArenaNode",
+)
+
+
+class CTreeArena:
+    """Компактное неизменяемое представление дерева конфигурации.
+
+    Узлы хранятся в параллельных массивах в порядке обхода в глубину (индекс 0 - корень):
+    родитель, первый потомок, следующий сосед, id строки и id набора тегов. Строки и наборы
+    тегов хранятся один раз в таблицах, строки дополнительно интернируются, поэтому
+    одинаковые строки разных деревьев тоже занимают память один раз.
+
+    Для изменения дерево нужно материализовать (to_ctree), изменить и собрать заново (from_ctree).
+    """
+
+    __slots__ = (
+        "_class",
+        "_parent",
+        "_first_child",
+        "_next_sibling",
+        "_line_id",
+        "_tags_id",
+        "_lines",
+        "_tag_sets",
+        "_masked_lines",
+    )
+
+    def __init__(self, ct_class: Type[CTree]) -> None:
+        self._class = ct_class
+        self._parent = array("i")
+        self._first_child = array("i")
+        self._next_sibling = array("i")
+        self._line_id = array("i")
+        self._tags_id = array("i")
+        self._lines: list[str] = []
+        self._tag_sets: list[TagSet] = []
+        self._masked_lines: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._parent)
+
+    @property
+    def root(self) -> CTreeArenaNode:
+        return CTreeArenaNode(self, 0)
+
+    @property
+    def nbytes(self) -> int:
+        """Размер массивов узлов в байтах (без таблиц строк и тегов)."""
+        arrays = (self._parent, self._first_child, self._next_sibling, self._line_id, self._tags_id)
+        return sum(arr.itemsize * len(arr) for arr in arrays)
+
+    @classmethod
+    def from_records(cls, vendor: Vendor, records: list[tuple[int, str, list[str]]]) -> CTreeArena:
+        """Сборка из плоского представления (глубина, строка, теги), см. CTreeSerializer.to_records."""
+        return cls._from_records(CTreeFactory.get_class(vendor), records)
+
+    @classmethod
+    def _from_records(cls, ct_class: Type[CTree], records: list[tuple[int, str, list[str]]]) -> CTreeArena:
+        arena = cls(ct_class)
+        line_ids: dict[str, int] = {}
+        tags_ids: dict[tuple[str, ...], int] = {}
+        # последний добавленный узел на каждой глубине, к нему крепится следующий сосед
+        last: list[int] = []
+        for indx, (depth, line, tags) in enumerate(records):
+            line_id = line_ids.get(line)
+            if line_id is None:
+                line_id = line_ids[line] = len(arena._lines)
+                arena._lines.append(sys.intern(line))
+            tags_key = tuple(tags)
+            tags_id = tags_ids.get(tags_key)
+            if tags_id is None:
+                tags_id = tags_ids[tags_key] = len(arena._tag_sets)
+                arena._tag_sets.append(TagSet.get(tags_key))
+
+            arena._line_id.append(line_id)
+            arena._tags_id.append(tags_id)
+            arena._first_child.append(-1)
+            arena._next_sibling.append(-1)
+            if depth == 0:
+                arena._parent.append(-1)
+            else:
+                parent = last[depth - 1]
+                arena._parent.append(parent)
+                if len(last) > depth:
+                    arena._next_sibling[last[depth]] = indx
+                else:
+                    arena._first_child[parent] = indx
+            del last[depth:]
+            last.append(indx)
+        return arena
+
+    @classmethod
+    def from_ctree(cls, root: CTree) -> CTreeArena:
+        records = [(depth, node.line, node._tags) for node, depth in iter_preorder(root)]
+        return cls._from_records(root.__class__, records)
+
+    def to_records(self) -> list[tuple[int, str, list[str]]]:
+        return [(depth, self.get_line(indx), self.get_tags(indx)) for indx, depth in self.iter_subtree(0)]
+
+    def to_ctree(self) -> CTree:
+        return self.materialize(0, children=True)
+
+    def get_line(self, indx: int) -> str:
+        return self._lines[self._line_id[indx]]
+
+    def get_masked_line(self, indx: int) -> str:
+        line_id = self._line_id[indx]
+        masked = self._masked_lines.get(line_id)
+        if masked is None:
+            masked = self._masked_lines[line_id] = self._class.mask_line(self._lines[line_id])
+        return masked
+
+    def get_tags(self, indx: int) -> list[str]:
+        return self._tag_sets[self._tags_id[indx]]
+
+    def iter_children(self, indx: int) -> Iterator[int]:
+        child = self._first_child[indx]
+        while child != -1:
+            yield child
+            child = self._next_sibling[child]
+
+    def iter_subtree(self, indx: int) -> Iterator[tuple[int, int]]:
+        """Узлы поддерева (включая сам узел) в порядке обхода в глубину: (индекс, глубина от узла)."""
+        yield indx, 0
+        stack = []
+        if self._first_child[indx] != -1:
+            stack.append((self._first_child[indx], 1))
+        while len(stack) > 0:
+            node, depth = stack.pop()
+            yield node, depth
+            if self._next_sibling[node] != -1:
+                stack.append((self._next_sibling[node], depth))
+            if self._first_child[node] != -1:
+                stack.append((self._first_child[node], depth + 1))
+
+    def get_path(self, indx: int) -> list[int]:
+        """Индексы узлов от корня (не включая) до узла."""
+        path = []
+        while indx > 0:
+            path.append(indx)
+            indx = self._parent[indx]
+        path.reverse()
+        return path
+
+    def attach(self, indx: int, root: CTree, *, children: bool) -> CTree:
+        """Добавление узла (вместе с цепочкой предков) в дерево root.
+
+        Существующие узлы переиспользуются, т.е. результат тот же, что root.merge(node.copy(children)).
+        """
+        node = root
+        for path_indx in self.get_path(indx):
+            node = self._get_or_create(path_indx, node)
+        if children:
+            parents = [node]
+            for sub_indx, depth in self.iter_subtree(indx):
+                if depth == 0:
+                    continue
+                del parents[depth:]
+                parents.append(self._get_or_create(sub_indx, parents[-1]))
+        return node
+
+    def _get_or_create(self, indx: int, parent: CTree) -> CTree:
+        line = self.get_line(indx)
+        node = parent.children.get(line)
+        if node is None:
+            node = self._class(line=line, parent=parent, tags=self.get_tags(indx))
+        return node
+
+    def materialize(self, indx: int, children: bool = True) -> CTree:
+        """Узел в виде CTree вместе с цепочкой предков, возвращается корень (аналог CTree.copy)."""
+        root = self._class(tags=self.get_tags(0))
+        _ = self.attach(indx, root, children=children)
+        return root
+
+    def iter_config(self, indx: int, masked: bool = False) -> Iterator[str]:
+        """Строки конфигурации узла, результат совпадает с CTree.config."""
+        # spaces/section_separator у CTree - свойства, у вендоров - атрибуты класса
+        proto = self._class()
+        spaces, separator = proto.spaces, proto.section_separator
+        get_line = self.get_masked_line if masked else self.get_line
+        path = self.get_path(indx)
+        for level, path_indx in enumerate(path):
+            yield spaces * level + get_line(path_indx)
+        base = len(path) - 1
+        for child in self.iter_children(indx):
+            for sub_indx, depth in self.iter_subtree(child):
+                yield spaces * (base + depth + 1) + get_line(sub_indx)
+            if indx == 0:
+                yield separator
+
+
+class CTreeArenaNode:
+    """Узел CTreeArena с интерфейсом CTree для чтения, сами данные хранятся в arena."""
+
+    __slots__ = ("_arena", "_indx")
+
+    def __init__(self, arena: CTreeArena, indx: int) -> None:
+        self._arena = arena
+        self._indx = indx
+
+    @property
+    def arena(self) -> CTreeArena:
+        return self._arena
+
+    @property
+    def line(self) -> str:
+        return self._arena.get_line(self._indx)
+
+    @property
+    def masked_line(self) -> str:
+        return self._arena.get_masked_line(self._indx)
+
+    @property
+    def tags(self) -> list[str]:
+        return self._arena.get_tags(self._indx)
+
+    @property
+    def parent(self) -> CTreeArenaNode | None:
+        parent = self._arena._parent[self._indx]
+        if parent == -1:
+            return None
+        return CTreeArenaNode(self._arena, parent)
+
+    @property
+    def children(self) -> dict[str, CTreeArenaNode]:
+        arena = self._arena
+        return {arena.get_line(child): CTreeArenaNode(arena, child) for child in arena.iter_children(self._indx)}
+
+    @property
+    def formal_path(self) -> str:
+        return " / ".join(self._arena.get_line(indx) for indx in self._arena.get_path(self._indx))
+
+    @property
+    def config(self) -> str:
+        return "\n".join(self._arena.iter_config(self._indx))
+
+    @property
+    def masked_config(self) -> str:
+        return "\n".join(self._arena.iter_config(self._indx, masked=True))
+
+    @property
+    def patch(self) -> str:
+        root = self._arena._class()
+        return self._arena.attach(self._indx, root, children=True).patch
+
+    @property
+    def masked_patch(self) -> str:
+        root = self._arena._class()
+        return self._arena.attach(self._indx, root, children=True).masked_patch
+
+    def materialize(self, children: bool = True) -> CTree:
+        return self._arena.materialize(self._indx, children=children)
+
+    def __str__(self) -> str:
+        return self.line
+
+    def __repr__(self) -> str:
+        return f"({id(self)}) '{self.line}'"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CTreeArenaNode):
+            return NotImplemented
+        return self._arena is other._arena and self._indx == other._indx
+
+    def __hash__(self) -> int:
+        return hash((id(self._arena), self._indx))
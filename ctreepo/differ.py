@@ -1,30 +1,43 @@
 import re
-from typing import Type
+from functools import lru_cache
+from typing import Iterator, Type
 
 from .abstract import CTree
+from .arena import CTreeArena
+from .patterns import combine_patterns
 from .postproc import _REGISTRY, CTreePostProc
 
 __all__ = ("CTreeDiffer",)
 
 
 class CTreeDiffer:
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _compile_sections(sections: tuple[str, ...]) -> tuple[re.Pattern[str], ...]:
+        # все шаблоны объединяются в один regex, если это не меняет результат (см. combine_patterns)
+        compiled = tuple(re.compile(section) for section in sections)
+        combined = combine_patterns(compiled)
+        if combined is not None:
+            return (combined,)
+        return compiled
+
     @classmethod
-    def _check_ordered(cls, a: CTree, ordered_sections: list[str] | None = None) -> bool:
-        if ordered_sections is not None:
-            for section in ordered_sections:
-                formal_line = " / ".join(a._formal_path)
-                if re.search(section, formal_line):
-                    return True
-        return False
+    def _get_matchers(cls, sections: list[str] | None) -> tuple[re.Pattern[str], ...]:
+        if sections is None:
+            return ()
+        return cls._compile_sections(tuple(sections))
+
+    @staticmethod
+    def _check_sections(path: str, matchers: tuple[re.Pattern[str], ...]) -> bool:
+        return any(matcher.search(path) for matcher in matchers)
 
     @classmethod
-    def _check_no_diff(cls, a: CTree, no_diff_sections: list[str] | None = None) -> bool:
-        if no_diff_sections is not None:
-            for section in no_diff_sections:
-                formal_line = " / ".join(a._formal_path)
-                if re.search(section, formal_line):
-                    return True
-        return False
+    def _attach(cls, node: CTree, parent: CTree) -> None:
+        # то же, что merge узла в parent, но без промежуточной копии
+        if node.line not in parent.children:
+            _ = node._copy(children=True, parent=parent)
+        else:
+            parent.children[node.line].merge(node)
 
     @classmethod
     def _diff_list(
@@ -32,41 +45,89 @@ class CTreeDiffer:
         a: CTree,  # текущая конфигурация
         b: CTree,  # целевая
         *,
+        result: CTree,  # узел итогового diff'a, соответствующий a, в него сразу крепим найденные отличия
+        path: str,  # formal_path узла a, собирается по ходу обхода
         existed_diff: CTree | None = None,
-        ordered_sections: list[str] | None = None,
-        no_diff_sections: list[str] | None = None,
+        ordered_sections: tuple[re.Pattern[str], ...] = (),
+        no_diff_sections: tuple[re.Pattern[str], ...] = (),
         masked: bool = False,
         negative: bool = False,  # если True, то вычисляем, что нужно удалить, т.е. чего нет в целевой конфигурации
-    ) -> list[CTree]:
-        result = []
-        _ordered = cls._check_ordered(a, ordered_sections)
+    ) -> None:
+        # вместо рекурсии - стек генераторов уровней: уровень отдает вложенную секцию,
+        # она обрабатывается целиком, после чего уровень продолжается с того же места
+        stack = [
+            cls._diff_level(
+                a,
+                b,
+                result=result,
+                path=path,
+                existed_diff=existed_diff,
+                ordered_sections=ordered_sections,
+                no_diff_sections=no_diff_sections,
+                masked=masked,
+                negative=negative,
+            )
+        ]
+        while len(stack) > 0:
+            nested = next(stack[-1], None)
+            if nested is None:
+                _ = stack.pop()
+                continue
+            child, b_child, nested_result, child_path = nested
+            stack.append(
+                cls._diff_level(
+                    child,
+                    b_child,
+                    result=nested_result,
+                    path=child_path,
+                    existed_diff=None,
+                    ordered_sections=ordered_sections,
+                    no_diff_sections=no_diff_sections,
+                    masked=masked,
+                    negative=negative,
+                )
+            )
+
+    @classmethod
+    def _diff_level(
+        cls,
+        a: CTree,
+        b: CTree,
+        *,
+        result: CTree,
+        path: str,
+        existed_diff: CTree | None,
+        ordered_sections: tuple[re.Pattern[str], ...],
+        no_diff_sections: tuple[re.Pattern[str], ...],
+        masked: bool,
+        negative: bool,
+    ) -> Iterator[tuple[CTree, CTree, CTree, str]]:
+        """Разница на одном уровне, вложенные секции отдаются как (a, b, result, path) в _diff_list."""
+        _ordered = cls._check_sections(path, ordered_sections)
         indx = 0
         if existed_diff is not None:
-            b = b.apply(existed_diff)
+            b = b.apply_view(existed_diff)
+        # в секциях с порядком новые строки устройство добавляет в конец, поэтому оставить можно
+        # только те строки, которые образуют начало целевой секции: жадно идем по a, сверяя
+        # с очередной строкой b, всё остальное удаляется и добавляется заново в нужном порядке
+        # (LCS тут не подходит: вставка в середину дала бы на устройстве другой порядок)
+        b_children = list(b.children.values()) if _ordered else []
         for child in a.children.values():
+            child_path = f"{path} / {child.line}" if a.parent is not None else child.line
             # для секций, требующих полной перезаписи (без вычисления diff'a)
-            _no_diff = cls._check_no_diff(child, no_diff_sections)
+            _no_diff = cls._check_sections(child_path, no_diff_sections)
             if _no_diff:
                 # делаем <undo> <section> (если она есть) когда negative=True
                 #! upd: не делаем, потому что будет reordering и <undo> уедет в конец, если
                 #! нужно удалять секцию, то это нужно добавлять через post-processing
-                # if negative:
-                #     if child.exists_in(b):
-                #         root = child.copy(children=not negative)
-                #         while len(node.children) == 1:
-                #             node = list(node.children.values())[0]
-                #         node.line = f"{node.undo} {node.line}"
-                #         root.rebuild(deep=True)
-                #         result.append(root)
                 # целиком добавляем (negative=False)
                 if not negative:
                     line = child.exists_in(b)
                     if len(line) == 0 or child != b.children.get(line):
-                        root = child.copy(children=True)
-                        result.append(root)
+                        cls._attach(child, result)
                 continue
             if _ordered:
-                if len(b.children) > indx and child.line == list(b.children.values())[indx].line:
+                if len(b_children) > indx and child.line == b_children[indx].line:
                     line = child.line
                     indx += 1
                 else:
@@ -74,38 +135,38 @@ class CTreeDiffer:
             else:
                 line = child.exists_in(b, masked)
             if len(line) == 0:
-                root = child.copy(children=not negative)
                 if negative:
-                    node = root
-                    while len(node.children) == 1:
-                        node = list(node.children.values())[0]
                     # добавить default? нужно кейс вспомнить
-                    # _ = node.__class__(f"default {node.line}", node.parent, node.tags.copy())
-                    if node.line.startswith(f"{node.undo} "):
-                        node.line = node.line.replace(f"{node.undo} ", "", 1)
+                    if child.line.startswith(f"{child.undo} "):
+                        undo_line = child.line.replace(f"{child.undo} ", "", 1)
                     else:
-                        node.line = f"{node.undo} {node.line}"
-                    root.rebuild(deep=True)
-                result.append(root)
+                        undo_line = f"{child.undo} {child.line}"
+                    if undo_line not in result.children:
+                        _ = child.__class__(line=undo_line, parent=result, tags=child._tags.copy())
+                else:
+                    cls._attach(child, result)
             else:
-                # todo тут если потомков нет, то нет смысла делать рекурсию, лишняя трата ресурсов
-                nested_result = cls._diff_list(
-                    child,
-                    b.children[line],
-                    existed_diff=None,
-                    ordered_sections=ordered_sections,
-                    no_diff_sections=no_diff_sections,
-                    masked=masked,
-                    negative=negative,
-                )
-                result.extend(nested_result)
-        return result
+                b_child = b.children[line]
+                # одинаковые поддеревья разницы не дают, в них не спускаемся
+                # (при masked строки могли совпасть только после маскирования, тогда сверяем и путь)
+                if child.content_hash == b_child.content_hash and (
+                    not masked or child._path_tuple == b_child._path_tuple
+                ):
+                    continue
+                # узел секции создаем заранее и убираем, если разницы в ней не нашлось
+                nested_result = result.children.get(child.line)
+                created = nested_result is None
+                if nested_result is None:
+                    nested_result = child.__class__(line=child.line, parent=result, tags=child._tags.copy())
+                yield child, b_child, nested_result, child_path
+                if created and len(nested_result.children) == 0:
+                    nested_result.delete()
 
     @classmethod
     def diff(
         cls,
-        a: CTree,
-        b: CTree,
+        a: CTree | CTreeArena,
+        b: CTree | CTreeArena,
         *,
         masked: bool = False,
         ordered_sections: list[str] | None = None,
@@ -113,36 +174,41 @@ class CTreeDiffer:
         reorder_root: bool = True,
         post_proc_rules: list[Type[CTreePostProc]] | None = None,
     ) -> CTree:
-        # TODO тут подумать, что бы сразу в нужный parent крепить узел, а не делать merge списка потом
-
+        # diff требует изменяемых деревьев с кешами, поэтому arena материализуется
+        if isinstance(a, CTreeArena):
+            a = a.to_ctree()
+        if isinstance(b, CTreeArena):
+            b = b.to_ctree()
         if a.__class__ != b.__class__:
             raise RuntimeError("a and b should be instances of the same class")
 
         root = a.__class__()
+        _ordered_sections = cls._get_matchers(ordered_sections)
+        _no_diff_sections = cls._get_matchers(no_diff_sections)
 
-        diff_list = cls._diff_list(
+        cls._diff_list(
             a,
             b,
+            result=root,
+            path=a.formal_path,
             existed_diff=None,
-            ordered_sections=ordered_sections,
-            no_diff_sections=no_diff_sections,
+            ordered_sections=_ordered_sections,
+            no_diff_sections=_no_diff_sections,
             masked=masked,
             negative=True,
         )
-        for leaf in diff_list:
-            root.merge(leaf)
 
-        diff_list = cls._diff_list(
+        cls._diff_list(
             b,
             a,
+            result=root,
+            path=b.formal_path,
             existed_diff=root,
-            ordered_sections=ordered_sections,
-            no_diff_sections=no_diff_sections,
+            ordered_sections=_ordered_sections,
+            no_diff_sections=_no_diff_sections,
             masked=masked,
             negative=False,
         )
-        for leaf in diff_list:
-            root.merge(leaf)
 
         negative = {node.line: node for node in root.children.values() if node.line.startswith(node.undo)}
         for node in negative.values():
@@ -1,13 +1,16 @@
 from pathlib import Path
-from typing import Any, Literal
+from typing import IO, Any, Iterable, Literal, Mapping, Sequence, overload
 
 from .abstract import CTree
+from .arena import CTreeArena
 from .differ import CTreeDiffer
-from .models import Vendor
+from .models import CTreeQuery, TagRegistry, Vendor
 from .parser import CTreeParser, TaggingRulesDict, TaggingRulesFile
 from .postproc import CTreePostProc
 from .searcher import CTreeSearcher
 from .serializer import CTreeSerializer
+from .snapshot import CTreeSnapshot
+from .view import CTreeView
 
 __all__ = ("CTreeEnv",)
 
@@ -21,6 +24,7 @@ class CTreeEnv:
         ordered_sections: list[str] | None = None,
         no_diff_sections: list[str] | None = None,
         post_proc_rules: list[type[CTreePostProc]] | None = None,
+        tag_index: bool = False,
     ):
         if isinstance(tagging_rules, str) or isinstance(tagging_rules, Path):
             _tr_file = TaggingRulesFile(tagging_rules)
@@ -32,10 +36,11 @@ class CTreeEnv:
             _tr_dict = None
 
         self.vendor = vendor
-        self._parser = CTreeParser(vendor=self.vendor, tagging_rules=_tr_file or _tr_dict)
+        self._parser = CTreeParser(vendor=self.vendor, tagging_rules=_tr_file or _tr_dict, tag_index=tag_index)
         self._ordered_sections = ordered_sections
         self._no_diff_sections = no_diff_sections
         self._post_proc_rules = post_proc_rules
+        self._tag_registry = TagRegistry()
 
     def parse(
         self,
@@ -45,10 +50,36 @@ class CTreeEnv:
             config=config,
         )
 
+    def parse_arena(
+        self,
+        config: str,
+    ) -> CTreeArena:
+        return self._parser.parse_arena(
+            config=config,
+        )
+
+    def parse_stream(
+        self,
+        source: Iterable[str] | Path | str,
+    ) -> CTree:
+        return self._parser.parse_stream(
+            source=source,
+        )
+
+    def parse_many(
+        self,
+        configs: Iterable[str | Path],
+        workers: int | None = None,
+    ) -> list[CTree | Exception]:
+        return self._parser.parse_many(
+            configs=configs,
+            workers=workers,
+        )
+
     def diff(
         self,
-        a: CTree,
-        b: CTree,
+        a: CTree | CTreeArena,
+        b: CTree | CTreeArena,
         masked: bool = False,
         reorder_root: bool = True,
     ) -> CTree:
@@ -64,7 +95,7 @@ class CTreeEnv:
 
     def to_dict(
         self,
-        ct: CTree,
+        ct: CTree | CTreeArena,
     ) -> dict[str, Any]:
         return CTreeSerializer.to_dict(root=ct)
 
@@ -77,21 +108,122 @@ class CTreeEnv:
             data=data,
         )
 
+    def dump(
+        self,
+        ct: CTree | CTreeArena,
+        fp: IO[bytes],
+        compression: Literal["gzip", "zstd"] | None = None,
+    ) -> None:
+        CTreeSerializer.dump(root=ct, fp=fp, compression=compression)
+
+    def load(
+        self,
+        fp: IO[bytes],
+    ) -> CTree:
+        return CTreeSerializer.load(
+            vendor=self.vendor,
+            fp=fp,
+        )
+
+    def open_snapshot(
+        self,
+        path: str | Path,
+    ) -> CTreeSnapshot:
+        return CTreeSnapshot.open(
+            vendor=self.vendor,
+            path=path,
+        )
+
+    @overload
+    def search(
+        self,
+        ct: CTree | CTreeArena,
+        query: CTreeQuery | None = None,
+        *,
+        string: str = "",
+        include_tags: list[str] | None = None,
+        include_mode: Literal["or", "and"] = "or",
+        exclude_tags: list[str] | None = None,
+        include_children: bool = False,
+        view: Literal[False] = False,
+    ) -> CTree: ...
+
+    @overload
     def search(
         self,
         ct: CTree,
+        query: CTreeQuery | None = None,
         *,
         string: str = "",
         include_tags: list[str] | None = None,
         include_mode: Literal["or", "and"] = "or",
         exclude_tags: list[str] | None = None,
         include_children: bool = False,
-    ) -> CTree:
+        view: Literal[True],
+    ) -> CTreeView: ...
+
+    def search(
+        self,
+        ct: CTree | CTreeArena,
+        query: CTreeQuery | None = None,
+        *,
+        string: str = "",
+        include_tags: list[str] | None = None,
+        include_mode: Literal["or", "and"] = "or",
+        exclude_tags: list[str] | None = None,
+        include_children: bool = False,
+        view: bool = False,
+    ) -> CTree | CTreeView:
+        if view:
+            if isinstance(ct, CTreeArena):
+                raise TypeError("view is not supported for CTreeArena, it is compact already")
+            return CTreeSearcher.search(
+                ct=ct,
+                query=query,
+                string=string,
+                include_tags=include_tags,
+                include_mode=include_mode,
+                exclude_tags=exclude_tags,
+                include_children=include_children,
+                tag_registry=self._tag_registry,
+                view=True,
+            )
         return CTreeSearcher.search(
             ct=ct,
+            query=query,
             string=string,
             include_tags=include_tags,
             include_mode=include_mode,
             exclude_tags=exclude_tags,
             include_children=include_children,
+            tag_registry=self._tag_registry,
         )
+
+    @overload
+    def search_many(
+        self,
+        ct: CTree,
+        queries: Sequence[CTreeQuery | Mapping[str, Any]],
+        *,
+        view: Literal[False] = False,
+    ) -> list[CTree]: ...
+
+    @overload
+    def search_many(
+        self,
+        ct: CTree,
+        queries: Sequence[CTreeQuery | Mapping[str, Any]],
+        *,
+        view: Literal[True],
+    ) -> list[CTreeView]: ...
+
+    def search_many(
+        self,
+        ct: CTree,
+        queries: Sequence[CTreeQuery | Mapping[str, Any]],
+        *,
+        view: bool = False,
+    ) -> list[CTree] | list[CTreeView]:
+        if view:
+            return CTreeSearcher.search_many(ct, queries, tag_registry=self._tag_registry, view=True)
+        return CTreeSearcher.search_many(ct, queries, tag_registry=self._tag_registry)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from heapq import merge
+from typing import TYPE_CHECKING, Collection, Iterator
+
+from .traversal import iter_preorder
+
+if TYPE_CHECKING:
+    from .abstract import CTree
+
+__all__ = ("CTreeTagIndex",)
+
+
+class CTreeTagIndex:
+    """Обратный индекс тег -> узлы дерева.
+
+    Подключается к дереву (CTree.enable_tag_index), любое изменение дерева (новые/удаленные
+    узлы, замена children/tags/parent, изменение словаря children на месте, обращение к CTree.tags)
+    сбрасывает индекс, он перестраивается при следующем обращении.
+    Узлы хранятся вместе с номером в порядке обхода в глубину, чтобы результаты поиска по индексу
+    собирались в том же порядке, что и при обходе дерева.
+    """
+
+    __slots__ = ("_root", "_nodes", "_ends")
+
+    def __init__(self, root: CTree) -> None:
+        self._root = root
+        self._nodes: dict[str, list[tuple[int, CTree]]] | None = None
+        # номер узла -> номер первого узла после его поддерева
+        self._ends: list[int] = []
+
+    @property
+    def is_valid(self) -> bool:
+        return self._nodes is not None
+
+    def invalidate(self) -> None:
+        self._nodes = None
+        self._ends = []
+
+    @property
+    def root(self) -> CTree:
+        return self._root
+
+    def _build(self) -> dict[str, list[tuple[int, CTree]]]:
+        # все узлы дерева получают ссылку на индекс: изменение любого узла сбрасывает индекс без
+        # подъема к корню, в том числе у узлов, которые попали в дерево с прошлой сборки индекса
+        nodes: dict[str, list[tuple[int, CTree]]] = {}
+        ends: list[int] = []
+        # номера узлов текущего пути от корня, поддерево узла заканчивается, когда узел уходит из пути
+        path: list[int] = []
+        for rank, (node, depth) in enumerate(iter_preorder(self._root)):
+            node._tag_index = self
+            for path_rank in path[depth:]:
+                ends[path_rank] = rank
+            del path[depth:]
+            path.append(rank)
+            ends.append(0)
+            for tag in set(node._tags):
+                nodes.setdefault(tag, []).append((rank, node))
+        for path_rank in path:
+            ends[path_rank] = len(ends)
+        self._nodes = nodes
+        self._ends = ends
+        return nodes
+
+    def get(self, tag: str) -> list[tuple[int, CTree]]:
+        """Узлы с тегом tag в порядке обхода дерева: (номер узла, узел)."""
+        nodes = self._nodes
+        if nodes is None:
+            nodes = self._build()
+        return nodes.get(tag, [])
+
+    def subtree_end(self, rank: int) -> int:
+        """Номер первого узла после поддерева узла rank, узлы поддерева - номера rank..end-1."""
+        if self._nodes is None:
+            _ = self._build()
+        return self._ends[rank]
+
+    def get_any(self, tags: Collection[str]) -> Iterator[tuple[int, CTree]]:
+        """Узлы, у которых есть хотя бы один из тегов (объединение), в порядке обхода дерева: (номер, узел)."""
+        unique = set(tags)
+        if len(unique) == 1:
+            yield from self.get(unique.pop())
+            return
+        last_rank = -1
+        for rank, node in merge(*(self.get(tag) for tag in unique), key=lambda item: item[0]):
+            if rank != last_rank:
+                last_rank = rank
+                yield rank, node
+
+    def get_all(self, tags: Collection[str]) -> Iterator[tuple[int, CTree]]:
+        """Узлы, у которых есть все теги (пересечение), в порядке обхода дерева: (номер, узел)."""
+        candidates = [self.get(tag) for tag in set(tags)]
+        if len(candidates) == 0:
+            return
+        # идем по самому короткому списку, остальные теги проверяем по узлу
+        shortest = min(candidates, key=len)
+        required = set(tags)
+        for rank, node in shortest:
+            if required.issubset(node._tags):
+                yield rank, node
@@ -1,12 +1,72 @@
+from __future__ import annotations
+
+import re
 from dataclasses import dataclass
 from enum import StrEnum
+from typing import Any, Iterable, Literal, NoReturn
+from weakref import WeakKeyDictionary, WeakValueDictionary
 
 __all__ = (
+    "CTreeProfile",
+    "CTreeQuery",
+    "TagRegistry",
+    "TagSet",
     "TaggingRule",
     "Vendor",
 )
 
 
+@dataclass(frozen=True, slots=True)
+class CTreeProfile:
+    # скомпилированные паттерны класса CTree (вендора), строятся один раз на класс
+    # None - список паттернов пустой, т.е. ничего не совпадает
+    junk_lines: re.Pattern[str] | None
+    mask_patterns: re.Pattern[str] | None
+    sections_without_exit: re.Pattern[str] | None
+    sections_require_exit: re.Pattern[str] | None
+
+
+@dataclass(frozen=True, slots=True)
+class CTreeQuery:
+    """Скомпилированный поисковый запрос (см. CTreeSearcher.search).
+
+    Создается один раз через compile и переиспользуется для любого количества деревьев,
+    объект неизменяемый и хешируемый (можно использовать как ключ словаря).
+    """
+
+    # None - строка поиска пустая, т.е. подходит любая строка
+    pattern: re.Pattern[str] | None
+    include_tags: frozenset[str]
+    include_mode: Literal["or", "and"]
+    exclude_tags: frozenset[str]
+    include_children: bool = False
+
+    @classmethod
+    def compile(
+        cls,
+        string: str = "",
+        include_tags: Iterable[str] | None = None,
+        include_mode: Literal["or", "and"] = "or",
+        exclude_tags: Iterable[str] | None = None,
+        include_children: bool = False,
+    ) -> CTreeQuery:
+        if include_mode not in ("or", "and"):
+            raise ValueError(f"unknown include_mode {include_mode}")
+        string = string.strip()
+        return cls(
+            pattern=re.compile(string) if len(string) != 0 else None,
+            include_tags=frozenset(include_tags or ()),
+            include_mode=include_mode,
+            exclude_tags=frozenset(exclude_tags or ()),
+            include_children=include_children,
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        """Запрос без критериев, результат поиска - пустое дерево."""
+        return self.pattern is None and len(self.include_tags) == 0 and len(self.exclude_tags) == 0
+
+
 @dataclass(frozen=True, slots=True)
 class TaggingRule:
     # - regex: ^ip vpn-instance (\\S+)$
@@ -20,6 +80,91 @@ class TaggingRule:
     tags: list[str]
 
 
+class TagSet(list[str]):
+    """Неизменяемый список тегов, один объект на каждый уникальный набор.
+
+    Сравнивается со списками как обычный list, copy() возвращает обычный (изменяемый) list,
+    поэтому копии узлов получают свои теги, которые можно менять. CTree.tags отдает узлу копию
+    при первом обращении, TagSet виден только через _tags.
+    """
+
+    __slots__ = ("__weakref__", "_hash")
+    _registry: WeakValueDictionary[tuple[str, ...], TagSet] = WeakValueDictionary()
+
+    def __init__(self, tags: Iterable[str] = ()) -> None:
+        super().__init__(tags)
+        self._hash = hash(tuple(self))
+
+    @classmethod
+    def get(cls, tags: Iterable[str]) -> TagSet:
+        key = tuple(tags)
+        tag_set = cls._registry.get(key)
+        if tag_set is None:
+            tag_set = cls(key)
+            cls._registry[key] = tag_set
+        return tag_set
+
+    def __hash__(self) -> int:  # type: ignore[override]
+        return self._hash
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return self.get, (tuple(self),)
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError("TagSet is immutable, use copy() to get a mutable list")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly  # type: ignore[assignment]
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly  # type: ignore[assignment]
+
+
+class TagRegistry:
+    """Соответствие тег -> бит, набор тегов узла превращается в битовую маску.
+
+    Проверки include/exclude при поиске сводятся к операциям с целыми числами. Биты получают
+    только теги запросов (register), остальные теги узлов (имена интерфейсов, vrf и т.п.) в маску
+    не попадают, поэтому число битов ограничено тегами, которые ищут. Маски TagSet кешируются
+    на время жизни набора (слабые ссылки), маска обычного списка тегов вычисляется каждый раз.
+    """
+
+    __slots__ = ("_bits", "_masks")
+
+    def __init__(self) -> None:
+        self._bits: dict[str, int] = {}
+        # набор тегов -> (маска, число битов на момент вычисления), после register маска пересчитывается
+        self._masks: WeakKeyDictionary[TagSet, tuple[int, int]] = WeakKeyDictionary()
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    def register(self, tags: Iterable[str]) -> int:
+        """Маска тегов запроса, тегам без бита выделяется новый бит."""
+        mask = 0
+        for tag in tags:
+            bit = self._bits.get(tag)
+            if bit is None:
+                bit = self._bits[tag] = 1 << len(self._bits)
+            mask |= bit
+        return mask
+
+    def get_mask(self, tags: Iterable[str]) -> int:
+        """Маска тегов узла, теги, которых нет в запросах, не учитываются."""
+        if isinstance(tags, TagSet):
+            cached = self._masks.get(tags)
+            if cached is not None and cached[1] == len(self._bits):
+                return cached[0]
+            mask = self._build_mask(tags)
+            self._masks[tags] = (mask, len(self._bits))
+            return mask
+        return self._build_mask(tags)
+
+    def _build_mask(self, tags: Iterable[str]) -> int:
+        mask = 0
+        bits = self._bits
+        for tag in tags:
+            mask |= bits.get(tag, 0)
+        return mask
+
+
 class Vendor(StrEnum):
     ARISTA = "arista"
     CISCO = "cisco"
@@ -1,18 +1,24 @@
 from __future__ import annotations
 
 import abc
+import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Type
+from typing import Iterable, Iterator, Type
 
 import yaml
 
 from .abstract import CTree
+from .arena import CTreeArena
 from .factory import CTreeFactory
-from .models import TaggingRule, Vendor
+from .models import TaggingRule, TagSet, Vendor
+from .serializer import CTreeSerializer
 
 __all__ = (
     "CTreeParser",
+    "CTreeTagger",
     "TaggingRules",
     "TaggingRulesFile",
     "TaggingRulesDict",
@@ -96,51 +102,198 @@ class TaggingRulesDict(TaggingRules):
         self.rules = result
 
 
+_REGEX_META = frozenset(".^$*+?{}[]\\|()")
+
+
+def _has_top_level_alternation(regex: str) -> bool:
+    depth = 0
+    in_class = False
+    escaped = False
+    for char in regex:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+    return False
+
+
+def _literal_prefix(regex: str) -> str:
+    """Литеральное начало regex, с которого обязана начинаться строка.
+
+    Возвращает пустую строку, если такого начала нет: regex без якоря "^",
+    с альтернативой на верхнем уровне или начинающийся со спецсимвола.
+    """
+    if not regex.startswith("^") or _has_top_level_alternation(regex):
+        return ""
+    prefix = []
+    for indx in range(1, len(regex)):
+        char = regex[indx]
+        if char in _REGEX_META:
+            break
+        quantifier = regex[indx + 1] if indx + 1 < len(regex) else ""
+        if quantifier in ("*", "?", "{"):
+            break
+        prefix.append(char)
+        if quantifier == "+":
+            break
+    return "".join(prefix)
+
+
+class CTreeTagger:
+    """Движок расстановки тегов.
+
+    Правила компилируются один раз. Для правил вида "^literal ..." литеральное начало
+    используется как фильтр: строка проверяется только теми правилами, у которых совпадает
+    первое слово, плюс правилами без литерального начала. Порядок правил сохраняется,
+    срабатывает первое подходящее правило (как и при последовательном переборе).
+    """
+
+    def __init__(self, rules: list[TaggingRule]) -> None:
+        self.rules = rules
+        # (индекс правила, скомпилированный regex, теги, литеральное начало)
+        self._entries: list[tuple[int, re.Pattern[str], list[str], str]] = []
+        self._by_token: dict[str, list[int]] = {}
+        self._common: list[int] = []
+        for indx, rule in enumerate(rules):
+            prefix = _literal_prefix(rule.regex)
+            self._entries.append((indx, re.compile(rule.regex), rule.tags, prefix))
+            token, sep, _ = prefix.partition(" ")
+            if len(sep) != 0:
+                self._by_token.setdefault(token, []).append(indx)
+            else:
+                self._common.append(indx)
+        self._default_bucket = self._make_bucket([])
+        self._buckets: dict[str, list[tuple[re.Pattern[str], list[str], str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _make_bucket(self, indexes: list[int]) -> list[tuple[re.Pattern[str], list[str], str]]:
+        return [self._entries[indx][1:] for indx in sorted(indexes + self._common)]
+
+    def _get_bucket(self, token: str) -> list[tuple[re.Pattern[str], list[str], str]]:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            indexes = self._by_token.get(token)
+            if indexes is None:
+                return self._default_bucket
+            bucket = self._make_bucket(indexes)
+            self._buckets[token] = bucket
+        return bucket
+
+    def get_tags(self, line: str) -> list[str] | None:
+        for pattern, tags, prefix in self._get_bucket(line.partition(" ")[0]):
+            if len(prefix) != 0 and not line.startswith(prefix):
+                continue
+            if m := pattern.search(line):
+                return [*tags, *m.groups()]
+        return None
+
+
+_WORKER_PARSER: CTreeParser | None = None
+
+
+def _strip_newlines(source: Iterable[str]) -> Iterator[str]:
+    """Строки без переводов строки, как после splitlines, но перевод строки в конце текста - пустая строка.
+
+    Строки, соединенные переводом строки, совпадают с текстом, который видит pre_run при разборе той же
+    конфигурации (см. CTree.pre_run_lines).
+    """
+    line = ""
+    for line in source:
+        yield line.rstrip("\r\n")
+    if line.endswith("\n"):
+        yield ""
+
+
+def _init_worker(parser: CTreeParser) -> None:
+    global _WORKER_PARSER
+    _WORKER_PARSER = parser
+
+
+def _parse_records(parser: CTreeParser, config: str | Path) -> list[tuple[int, str, list[str]]] | Exception:
+    # в основной процесс отдаем плоский список записей, а не граф объектов
+    try:
+        if isinstance(config, Path):
+            root = parser.parse_stream(config)
+        else:
+            root = parser.parse(config)
+        return CTreeSerializer.to_records(root)
+    except Exception as exc:
+        return exc
+
+
+def _parse_worker(config: str | Path) -> list[tuple[int, str, list[str]]] | Exception:
+    if _WORKER_PARSER is None:
+        raise RuntimeError("worker is not initialized")
+    return _parse_records(_WORKER_PARSER, config)
+
+
 class CTreeParser:
-    def __init__(self, vendor: Vendor, tagging_rules: TaggingRules | None = None) -> None:
+    def __init__(self, vendor: Vendor, tagging_rules: TaggingRules | None = None, tag_index: bool = False) -> None:
+        self.vendor = vendor
         self._class = CTreeFactory.get_class(vendor)
+        # подключать к разобранным деревьям обратный индекс тегов (см. CTree.enable_tag_index)
+        self.tag_index = tag_index
         if tagging_rules is None:
             self.tagging_rules = []
         else:
             self.tagging_rules = tagging_rules.rules.get(vendor, [])
+        self._tagger = CTreeTagger(self.tagging_rules)
 
     def _get_tags(self, line: str) -> list[str] | None:
-        for rule in self.tagging_rules:
-            if m := re.search(rule.regex, line):
-                return [*rule.tags, *m.groups()]
-        return None
+        return self._tagger.get_tags(line)
 
-    def _parse(self, ct: Type[CTree], config: str) -> CTree:
-        root = ct()
+    def _parse(self, ct: Type[CTree], lines: Iterable[str]) -> CTree:
+        root = ct(tags=TagSet.get(()))
         section = [root]
         spaces = [0]
+        # formal path секций, в которых находимся, нужен только для тегов
+        paths = [""]
+        tagging = len(self.tagging_rules) != 0
         previous_node: CTree = root
-        for line in config.splitlines():
+        previous_path = ""
+        junk_lines = ct.get_profile().junk_lines
+        for line in lines:
             if len(line.strip()) == 0:
                 continue
-            skip_pattern = "|".join(ct.junk_lines)  # type: ignore[arg-type]
-            if re.fullmatch(skip_pattern, line):
+            if junk_lines is not None and junk_lines.fullmatch(line):
                 continue
 
             # число пробелов у текущей строки
             current_space = len(line) - len(line.lstrip())
-            line = line.strip()
+            # одинаковые строки (undo shutdown, port link-type trunk, ...) повторяются во всех
+            # конфигурациях, интернированная строка хранится один раз на все деревья
+            line = sys.intern(line.strip())
 
             # мы вошли в секцию
             if current_space > spaces[-1]:
                 section.append(previous_node)
                 spaces.append(current_space)
+                paths.append(previous_path)
             # мы вышли из секции
             elif current_space < spaces[-1]:
                 while current_space != spaces[-1]:
                     _ = section.pop()
                     _ = spaces.pop()
+                    _ = paths.pop()
 
             parent = section[-1]
-            if len(self.tagging_rules) != 0:
-                full_line = parent._formal_path
-                full_line.append(line)
-                tags = self._get_tags(" / ".join(full_line))
+            if tagging:
+                previous_path = f"{paths[-1]} / {line}" if len(paths) > 1 else line
+                tags = self._get_tags(previous_path)
+                if tags is not None:
+                    tags = TagSet.get(tags)
             else:
                 tags = None
 
@@ -153,6 +306,78 @@ class CTreeParser:
 
     def parse(self, config: str) -> CTree:
         config = self._class.pre_run(config)
-        root = self._parse(self._class, config)
+        root = self._parse(self._class, config.splitlines())
         root.post_run()
+        if self.tag_index:
+            _ = root.enable_tag_index()
         return root
+
+    def parse_arena(self, config: str) -> CTreeArena:
+        """Разбор конфигурации в компактное представление CTreeArena.
+
+        Дерево CTree строится только на время разбора (нужно для post_run), поэтому при загрузке
+        большого числа конфигураций в памяти одновременно находится не больше одного CTree.
+        """
+        config = self._class.pre_run(config)
+        root = self._parse(self._class, config.splitlines())
+        root.post_run()
+        return CTreeArena.from_ctree(root)
+
+    def parse_stream(self, source: Iterable[str] | Path | str) -> CTree:
+        """Потоковый разбор конфигурации.
+
+        Дерево строится по мере чтения строк, вся конфигурация целиком в памяти не хранится.
+
+        Args:
+            source (Iterable[str] | Path | str): итерируемый объект со строками конфигурации
+                (список, генератор, открытый файл) или путь к файлу
+
+        Returns:
+            CTree: дерево конфигурации
+        """
+        if isinstance(source, (str, Path)):
+            with open(source, "r") as f:
+                return self.parse_stream(f)
+        root = self._parse(self._class, self._class.pre_run_lines(_strip_newlines(source)))
+        root.post_run()
+        if self.tag_index:
+            _ = root.enable_tag_index()
+        return root
+
+    def parse_many(
+        self,
+        configs: Iterable[str | Path],
+        workers: int | None = None,
+    ) -> list[CTree | Exception]:
+        """Параллельный разбор набора конфигураций в пуле процессов.
+
+        Args:
+            configs (Iterable[str | Path]): тексты конфигураций (str) или пути к файлам (Path)
+            workers (int | None): число процессов, по умолчанию число ядер; при 1 разбор идет
+                в текущем процессе
+
+        Returns:
+            list[CTree | Exception]: деревья в порядке входных данных, для конфигураций, которые
+                не удалось разобрать, вместо дерева возвращается исключение
+        """
+        configs = list(configs)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1 or len(configs) <= 1:
+            # в текущем процессе парсер не запоминается в _WORKER_PARSER, чтобы не держать его после вызова
+            results = [_parse_records(self, config) for config in configs]
+        else:
+            chunksize = max(1, len(configs) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+                results = list(executor.map(_parse_worker, configs, chunksize=chunksize))
+
+        trees: list[CTree | Exception] = []
+        for result in results:
+            if isinstance(result, Exception):
+                trees.append(result)
+            else:
+                root = CTreeSerializer.from_records(self.vendor, result)
+                if self.tag_index:
+                    _ = root.enable_tag_index()
+                trees.append(root)
+        return trees
@@ -0,0 +1,22 @@
+import re
+from functools import lru_cache
+
+__all__ = ("combine_patterns",)
+
+
+@lru_cache(maxsize=64)
+def combine_patterns(patterns: tuple[re.Pattern[str], ...]) -> re.Pattern[str] | None:
+    """Один regex "p1|p2|...", который находит строку, если ее находит хотя бы один из patterns.
+
+    None, если объединить нельзя: в общем regex номера групп сдвигаются, поэтому обратные ссылки
+    и условия на группы ((?(1)...)) поменяли бы смысл, - regex с группами не объединяются, так же
+    как regex с флагами (флаги не в начале общего regex'a не компилируются).
+    """
+    if len(patterns) < 2:
+        return None
+    if any(pattern.groups != 0 or pattern.flags != re.UNICODE for pattern in patterns):
+        return None
+    try:
+        return re.compile("|".join(f"(?:{pattern.pattern})" for pattern in patterns))
+    except re.error:
+        return None
@@ -1,100 +1,361 @@
 import re
-from typing import Literal
+from typing import Any, Literal, Mapping, Sequence, overload
 
 from .abstract import CTree
+from .arena import CTreeArena
+from .index import CTreeTagIndex
+from .models import CTreeQuery, TagRegistry
+from .patterns import combine_patterns
+from .view import CTreeView
 
 __all__ = ("CTreeSearcher",)
 
+# используется, если у вызывающего (CTreeEnv) нет своего
+_TAG_REGISTRY = TagRegistry()
+
 
 class CTreeSearcher:
+    @staticmethod
+    def _match_tags(tags_mask: int, include_mask: int, include_mode: Literal["or", "and"], exclude_mask: int) -> bool:
+        if tags_mask & exclude_mask != 0:
+            return False
+        if include_mask == 0:
+            return True
+        if include_mode == "or":
+            return tags_mask & include_mask != 0
+        return tags_mask & include_mask == include_mask
+
     @classmethod
     def _search(
         cls,
         ct: CTree,
-        string: str,
-        include_tags: list[str],
-        include_mode: Literal["or", "and"],
-        exclude_tags: list[str],
-        include_children: bool,
+        query: CTreeQuery,
+        include_mask: int,
+        exclude_mask: int,
+        tag_registry: TagRegistry,
     ) -> list[CTree]:
-        """рекурсивный поиск."""
+        """поиск обходом в глубину, теги сравниваются битовыми масками, возвращаются найденные узлы."""
         result = []
+        pattern = query.pattern
+        include_mode = query.include_mode
+        include_children = query.include_children
+        check_tags = include_mask != 0 or exclude_mask != 0
+        stack = [ct]
+        while len(stack) > 0:
+            node = stack.pop()
+            if pattern is None:
+                match_result = True
+            else:
+                match_result = pattern.search(node._line) is not None
 
-        if len(string) == 0:
-            string_match = True
-        else:
-            string_match = re.search(string, ct.line) is not None
-
-        if len(include_tags) == 0:
-            tags_match = True
-        elif include_mode == "or" and not set(include_tags).isdisjoint(set(ct.tags)):
-            tags_match = True
-        elif include_mode == "and" and set(include_tags).issubset(set(ct.tags)):
-            tags_match = True
-        else:
-            tags_match = False
-
-        if not set(exclude_tags).isdisjoint(set(ct.tags)):
-            tags_match = False
-
-        match_result = all([string_match, tags_match])
-        if match_result:
-            result.append(ct.copy(children=include_children))
-        if not match_result or not include_children:
-            for child in ct.children.values():
-                result.extend(
-                    cls._search(
-                        ct=child,
-                        string=string,
-                        include_tags=include_tags,
-                        include_mode=include_mode,
-                        exclude_tags=exclude_tags,
-                        include_children=include_children,
-                    )
-                )
+            if match_result and check_tags:
+                tags_mask = tag_registry.get_mask(node._tags)
+                match_result = cls._match_tags(tags_mask, include_mask, include_mode, exclude_mask)
+
+            if match_result:
+                result.append(node)
+            if not match_result or not include_children:
+                stack.extend(reversed(node._children.values()))
+
+        return result
+
+    @classmethod
+    def _search_index(
+        cls,
+        index: CTreeTagIndex,
+        query: CTreeQuery,
+        include_mask: int,
+        exclude_mask: int,
+        tag_registry: TagRegistry,
+    ) -> list[CTree]:
+        """Поиск по индексу тегов: проверяются только узлы с include-тегами.
 
+        Кандидаты идут в порядке обхода дерева, поэтому результат совпадает с _search. Если узел
+        найден вместе с потомками, то его потомки пропускаются, как и при обходе дерева.
+        """
+        result = []
+        if query.include_mode == "or":
+            candidates = index.get_any(query.include_tags)
+        else:
+            candidates = index.get_all(query.include_tags)
+        pattern = query.pattern
+        include_children = query.include_children
+        # кандидаты до этого номера - потомки узла, найденного вместе с потомками
+        skip_until = 0
+        for rank, node in candidates:
+            if rank < skip_until:
+                continue
+            if pattern is not None and pattern.search(node._line) is None:
+                continue
+            tags_mask = tag_registry.get_mask(node._tags)
+            if cls._match_tags(tags_mask, include_mask, query.include_mode, exclude_mask):
+                result.append(node)
+                if include_children:
+                    skip_until = index.subtree_end(rank)
         return result
 
+    @classmethod
+    def _search_arena(cls, arena: CTreeArena, root: CTree, query: CTreeQuery) -> None:
+        """поиск по CTreeArena, результат сразу добавляется в root.
+
+        Совпадение строки и тегов проверяется один раз на уникальную строку и набор тегов.
+        """
+        pattern = query.pattern
+        include_tags = query.include_tags
+        exclude_tags = query.exclude_tags
+        string_match: dict[int, bool] = {}
+        tags_match: dict[int, bool] = {}
+        stack = [0]
+        while len(stack) > 0:
+            indx = stack.pop()
+            line_id = arena._line_id[indx]
+            line_result = string_match.get(line_id)
+            if line_result is None:
+                line_result = pattern is None or pattern.search(arena._lines[line_id]) is not None
+                string_match[line_id] = line_result
+            tags_id = arena._tags_id[indx]
+            tags_result = tags_match.get(tags_id)
+            if tags_result is None:
+                tags = arena._tag_sets[tags_id]
+                if len(include_tags) == 0:
+                    tags_result = True
+                elif query.include_mode == "or":
+                    tags_result = not include_tags.isdisjoint(tags)
+                else:
+                    tags_result = include_tags.issubset(tags)
+                tags_result = tags_result and exclude_tags.isdisjoint(tags)
+                tags_match[tags_id] = tags_result
+
+            match_result = line_result and tags_result
+            if match_result:
+                _ = arena.attach(indx, root, children=query.include_children)
+            if not match_result or not query.include_children:
+                stack.extend(reversed(list(arena.iter_children(indx))))
+
+    @overload
+    @classmethod
+    def search(
+        cls,
+        ct: CTree | CTreeArena,
+        query: CTreeQuery | None = None,
+        *,
+        string: str = "",
+        include_tags: list[str] | None = None,
+        include_mode: Literal["or", "and"] = "or",
+        exclude_tags: list[str] | None = None,
+        include_children: bool = False,
+        tag_registry: TagRegistry | None = None,
+        view: Literal[False] = False,
+    ) -> CTree: ...
+
+    @overload
     @classmethod
     def search(
         cls,
         ct: CTree,
+        query: CTreeQuery | None = None,
+        *,
+        string: str = "",
+        include_tags: list[str] | None = None,
+        include_mode: Literal["or", "and"] = "or",
+        exclude_tags: list[str] | None = None,
+        include_children: bool = False,
+        tag_registry: TagRegistry | None = None,
+        view: Literal[True],
+    ) -> CTreeView: ...
+
+    @classmethod
+    def search(
+        cls,
+        ct: CTree | CTreeArena,
+        query: CTreeQuery | None = None,
         *,
         string: str = "",
         include_tags: list[str] | None = None,
         include_mode: Literal["or", "and"] = "or",
         exclude_tags: list[str] | None = None,
         include_children: bool = False,
-    ) -> CTree:
+        tag_registry: TagRegistry | None = None,
+        view: bool = False,
+    ) -> CTree | CTreeView:
         """Поиск конфигурации в дереве.
 
         Args:
-            ct (ConfigTree): где ищем
+            ct (ConfigTree | CTreeArena): где ищем
+            query (CTreeQuery): скомпилированный запрос, вместо string/include_*/exclude_tags/include_children
             string (str): что ищем, может быть regex строкой
             include_tags (list[str]): список тегов, по которым выборку делаем
             include_mode (Literal["or", "and"]): логика объединения критериев поиска
             exclude_tags (list[str]): список тегов-исключений, не должно быть на узле
             include_children (bool): включать потомков найденной секции или нет
+            tag_registry (TagRegistry): соответствие тег -> бит, по умолчанию общее на модуль
+            view (bool): вернуть CTreeView поверх исходного дерева вместо копии найденных узлов,
+                только для CTree
 
         Returns:
-            ConfigTree: новое дерево с отфильтрованным результатом
+            ConfigTree | CTreeView: новое дерево с отфильтрованным результатом или view
         """
-        if include_tags is None:
-            include_tags = []
-        if exclude_tags is None:
-            exclude_tags = []
-        string = string.strip()
-        root = ct.__class__()
-        if len(string) == 0 and len(include_tags) == 0 and len(exclude_tags) == 0:
+        if query is None:
+            query = CTreeQuery.compile(string, include_tags, include_mode, exclude_tags, include_children)
+        elif string != "" or include_tags or include_mode != "or" or exclude_tags or include_children:
+            raise TypeError("query can't be combined with string/include_tags/exclude_tags/include_children")
+        if isinstance(ct, CTreeArena):
+            if view:
+                raise TypeError("view is not supported for CTreeArena, it is compact already")
+            root = ct._class()
+        else:
+            root = ct.__class__()
+        if query.is_empty:
+            if view and isinstance(ct, CTree):
+                return CTreeView.from_nodes(ct, [])
             return root
-        filter_result = cls._search(
-            ct=ct,
-            string=string,
-            include_tags=include_tags,
-            include_mode=include_mode,
-            exclude_tags=exclude_tags,
-            include_children=include_children,
-        )
-        for node in filter_result:
-            root.merge(node)
+        if isinstance(ct, CTreeArena):
+            cls._search_arena(arena=ct, root=root, query=query)
+            return root
+        if tag_registry is None:
+            tag_registry = _TAG_REGISTRY
+        include_mask = tag_registry.register(query.include_tags)
+        exclude_mask = tag_registry.register(query.exclude_tags)
+        index = ct.tag_index if ct.parent is None else None
+        if index is not None and include_mask != 0:
+            filter_result = cls._search_index(index, query, include_mask, exclude_mask, tag_registry)
+        else:
+            filter_result = cls._search(ct, query, include_mask, exclude_mask, tag_registry)
+        if view:
+            return CTreeView.from_nodes(ct, filter_result, include_children=query.include_children)
+        return cls._copy_result(ct, filter_result, query.include_children)
+
+    @staticmethod
+    def _copy_result(ct: CTree, nodes: list[CTree], include_children: bool) -> CTree:
+        root = ct.__class__()
+        for node in nodes:
+            root.merge(node.copy(children=include_children))
         return root
+
+    @staticmethod
+    def _get_query(query: CTreeQuery | Mapping[str, Any]) -> CTreeQuery:
+        if isinstance(query, CTreeQuery):
+            return query
+        return CTreeQuery.compile(**query)
+
+    @overload
+    @classmethod
+    def search_many(
+        cls,
+        ct: CTree,
+        queries: Sequence[CTreeQuery | Mapping[str, Any]],
+        *,
+        tag_registry: TagRegistry | None = None,
+        view: Literal[False] = False,
+    ) -> list[CTree]: ...
+
+    @overload
+    @classmethod
+    def search_many(
+        cls,
+        ct: CTree,
+        queries: Sequence[CTreeQuery | Mapping[str, Any]],
+        *,
+        tag_registry: TagRegistry | None = None,
+        view: Literal[True],
+    ) -> list[CTreeView]: ...
+
+    @classmethod
+    def search_many(
+        cls,
+        ct: CTree,
+        queries: Sequence[CTreeQuery | Mapping[str, Any]],
+        *,
+        tag_registry: TagRegistry | None = None,
+        view: bool = False,
+    ) -> list[CTree] | list[CTreeView]:
+        """Выполнение нескольких поисков за один обход дерева.
+
+        Args:
+            ct (CTree): где ищем
+            queries (Sequence[CTreeQuery | Mapping[str, Any]]): запросы, CTreeQuery или словари с ключами
+                как у аргументов search (string, include_tags, include_mode, exclude_tags, include_children)
+            tag_registry (TagRegistry): соответствие тег -> бит, по умолчанию общее на модуль
+            view (bool): результаты в виде CTreeView вместо копий найденных узлов
+
+        Returns:
+            list[CTree] | list[CTreeView]: результаты в порядке запросов, каждый совпадает с search
+        """
+        if tag_registry is None:
+            tag_registry = _TAG_REGISTRY
+        parsed = [cls._get_query(query) for query in queries]
+
+        # запросы храним битами: бит i - запрос queries[i]
+        active = 0
+        children_bits = 0
+        any_string_bits = 0
+        string_queries: dict[re.Pattern[str], int] = {}
+        tag_queries: list[tuple[int, int, Literal["or", "and"], int]] = []
+        for bit, query in enumerate(parsed):
+            if query.is_empty:
+                continue
+            active |= 1 << bit
+            if query.include_children:
+                children_bits |= 1 << bit
+            if query.pattern is None:
+                any_string_bits |= 1 << bit
+            else:
+                string_queries[query.pattern] = string_queries.get(query.pattern, 0) | 1 << bit
+            include_mask = tag_registry.register(query.include_tags)
+            exclude_mask = tag_registry.register(query.exclude_tags)
+            if include_mask != 0 or exclude_mask != 0:
+                tag_queries.append((1 << bit, include_mask, query.include_mode, exclude_mask))
+        tag_bits = 0
+        for bit, *_ in tag_queries:
+            tag_bits |= bit
+
+        patterns = tuple(string_queries)
+        # строка, на которой не нашлось общего regex, не подходит ни под один из запросов
+        combined = combine_patterns(patterns)
+        string_bits = tuple(string_queries.values())
+        # результат по строке и по маске тегов: биты подходящих запросов
+        line_cache: dict[str, int] = {}
+        tags_cache: dict[int, int] = {}
+
+        found: list[list[CTree]] = [[] for _ in parsed]
+        stack = [(ct, active)] if active != 0 else []
+        while len(stack) > 0:
+            node, node_active = stack.pop()
+            line_match = line_cache.get(node._line)
+            if line_match is None:
+                line_match = any_string_bits
+                if combined is None or combined.search(node._line) is not None:
+                    for pattern, bits in zip(patterns, string_bits, strict=True):
+                        if pattern.search(node._line) is not None:
+                            line_match |= bits
+                line_cache[node._line] = line_match
+
+            matched = node_active & line_match
+            if matched & tag_bits != 0:
+                tags_mask = tag_registry.get_mask(node._tags)
+                tags_match = tags_cache.get(tags_mask)
+                if tags_match is None:
+                    tags_match = ~tag_bits
+                    for bit, include_mask, include_mode, exclude_mask in tag_queries:
+                        if cls._match_tags(tags_mask, include_mask, include_mode, exclude_mask):
+                            tags_match |= bit
+                    tags_cache[tags_mask] = tags_match
+                matched &= tags_match
+
+            if matched != 0:
+                bits = matched
+                while bits != 0:
+                    low = bits & -bits
+                    found[low.bit_length() - 1].append(node)
+                    bits ^= low
+            # запросы с include_children в поддереве найденного узла уже не проверяются
+            child_active = node_active & ~(matched & children_bits)
+            if child_active != 0:
+                stack.extend((child, child_active) for child in reversed(node._children.values()))
+
+        if view:
+            return [
+                CTreeView.from_nodes(ct, nodes, include_children=query.include_children)
+                for nodes, query in zip(found, parsed, strict=True)
+            ]
+        return [cls._copy_result(ct, nodes, query.include_children) for nodes, query in zip(found, parsed, strict=True)]
@@ -1,28 +1,290 @@
-from typing import Any
+from __future__ import annotations
+
+import gzip
+import struct
+import sys
+from array import array
+from typing import IO, Any, Iterator, Literal
 
 from .abstract import CTree
+from .arena import CTreeArena
 from .factory import CTreeFactory
-from .models import Vendor
+from .models import TagSet, Vendor
+from .traversal import iter_preorder
 
 __all__ = ("CTreeSerializer",)
 
+# бинарный формат (все числа - u32 little-endian):
+#   заголовок _HEADER: magic, версия, сжатие остальной части файла (_COMPRESSION), резерв
+#   _COUNTS: число узлов, строк, наборов тегов, id тегов во всех наборах
+#   таблица строк: длины строк в байтах, затем utf-8 строк подряд, выровнено до 4 байт
+#   таблица наборов тегов: размеры наборов, затем id строк тегов всех наборов подряд
+#   узлы в порядке обхода в глубину, по столбцам: id строки, id набора тегов, число потомков,
+#   размер поддерева (без самого узла) - следующий сосед узла i находится по индексу i + 1 + размер
+# длины вместо смещений и столбцы вместо записей узлов заметно лучше сжимаются
+_MAGIC = b"CTRB"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBBH")
+_COUNTS = struct.Struct("<IIII")
+_COMPRESSION: dict[str | None, int] = {None: 0, "gzip": 1, "zstd": 2}
+
 
 class CTreeSerializer:
     @classmethod
-    def to_dict(cls, root: CTree) -> dict[str, Any]:
-        children: dict[str, dict[str, Any]] = {}
-        result = {
-            "line": root.line,
-            "tags": root.tags,
-        }
-        for child in root.children.values():
-            children |= {child.line: cls.to_dict(child)}
-        return result | {"children": children}
+    def to_dict(cls, root: CTree | CTreeArena) -> dict[str, Any]:
+        # за один проход без рекурсии: словарь узла создается один раз и сразу кладется
+        # в children родителя
+        if isinstance(root, CTreeArena):
+            return cls._arena_to_dict(root)
+        result: dict[str, Any] = {"line": root._line, "tags": root._tags.copy(), "children": {}}
+        stack = [(root, result["children"])]
+        while len(stack) > 0:
+            node, children = stack.pop()
+            for child in node._children.values():
+                child_children: dict[str, Any] = {}
+                children[child._line] = {"line": child._line, "tags": child._tags.copy(), "children": child_children}
+                if len(child._children) != 0:
+                    stack.append((child, child_children))
+        return result
+
+    @classmethod
+    def _arena_to_dict(cls, arena: CTreeArena) -> dict[str, Any]:
+        # parents[depth] - children узла на глубине depth текущего пути
+        result: dict[str, Any] = {}
+        parents: list[dict[str, Any]] = []
+        for indx, depth in arena.iter_subtree(0):
+            line = arena.get_line(indx)
+            children: dict[str, Any] = {}
+            data = {"line": line, "tags": arena.get_tags(indx).copy(), "children": children}
+            if depth == 0:
+                result = data
+            else:
+                del parents[depth:]
+                parents[-1][line] = data
+            parents.append(children)
+        return result
+
+    @classmethod
+    def to_records(cls, root: CTree | CTreeArena) -> list[tuple[int, str, list[str]]]:
+        """Плоское представление дерева: (глубина, строка, теги) в порядке обхода в глубину.
+
+        Компактнее вложенных словарей и не требует рекурсии при pickle, поэтому
+        используется для передачи деревьев между процессами.
+        """
+        if isinstance(root, CTreeArena):
+            return root.to_records()
+        return [(depth, node.line, node._tags) for node, depth in iter_preorder(root)]
+
+    @classmethod
+    def from_records(cls, vendor: Vendor, records: list[tuple[int, str, list[str]]]) -> CTree:
+        _ct_class = CTreeFactory.get_class(vendor)
+        parents: list[CTree] = []
+        for depth, line, tags in records:
+            del parents[depth:]
+            node = _ct_class(
+                line=sys.intern(line),
+                parent=parents[-1] if len(parents) != 0 else None,
+                tags=TagSet.get(tags),
+            )
+            parents.append(node)
+        return parents[0]
 
     @classmethod
     def from_dict(cls, vendor: Vendor, data: dict[str, Any], parent: CTree | None = None) -> CTree:
         _ct_class = CTreeFactory.get_class(vendor)
-        node = _ct_class(line=data.get("line", ""), parent=parent, tags=data.get("tags", []))
-        for child in data.get("children", {}).values():
-            cls.from_dict(vendor, child, node)
-        return node
+        root = _ct_class(line=data.get("line", ""), parent=parent, tags=data.get("tags", []))
+        stack = [(root, data)] if len(data.get("children", ())) != 0 else []
+        while len(stack) > 0:
+            node, node_data = stack.pop()
+            for child_data in node_data["children"].values():
+                child = _ct_class(line=child_data.get("line", ""), parent=node, tags=child_data.get("tags", []))
+                if len(child_data.get("children", ())) != 0:
+                    stack.append((child, child_data))
+        return root
+
+    @classmethod
+    def dump(
+        cls,
+        root: CTree | CTreeArena,
+        fp: IO[bytes],
+        compression: Literal["gzip", "zstd"] | None = None,
+    ) -> None:
+        """Запись дерева в компактном бинарном формате.
+
+        Строки и наборы тегов записываются один раз в таблицы, узлы - столбцами чисел фиксированного
+        размера со ссылками на таблицы. Сжатие zstd требует пакет zstandard. Несжатые деревья можно
+        записывать в один файл друг за другом, сжатое дерево должно быть последним в файле (при
+        чтении распаковщик читает файл с запасом).
+
+        Args:
+            root (CTree | CTreeArena): корень дерева
+            fp (IO[bytes]): файл, открытый на запись в бинарном режиме, не закрывается
+            compression (Literal["gzip", "zstd"] | None): сжатие всего, кроме заголовка
+        """
+        if compression not in _COMPRESSION:
+            raise ValueError(f"unknown compression {compression}")
+        nodes: Iterator[tuple[str, list[str], int]]
+        if isinstance(root, CTreeArena):
+            nodes = ((root.get_line(indx), root.get_tags(indx), depth) for indx, depth in root.iter_subtree(0))
+        else:
+            nodes = ((node._line, node._tags, depth) for node, depth in iter_preorder(root))
+
+        strings: dict[str, int] = {}
+        tag_sets: dict[tuple[str, ...], int] = {}
+        tag_sizes = array("I")
+        tag_ids = array("I")
+        line_column = array("I")
+        tags_column = array("I")
+        children_column = array("I")
+        size_column = array("I")
+        # индексы узлов текущего пути от корня, размер поддерева известен, когда узел уходит из пути
+        path: list[int] = []
+        for indx, (line, tags, depth) in enumerate(nodes):
+            line_id = strings.get(line)
+            if line_id is None:
+                line_id = strings[line] = len(strings)
+            tags_key = tuple(tags)
+            tags_id = tag_sets.get(tags_key)
+            if tags_id is None:
+                tags_id = tag_sets[tags_key] = len(tag_sets)
+                tag_ids.extend(strings.setdefault(tag, len(strings)) for tag in tags_key)
+                tag_sizes.append(len(tags_key))
+            for parent in path[depth:]:
+                size_column[parent] = indx - parent - 1
+            del path[depth:]
+            if depth != 0:
+                children_column[path[-1]] += 1
+            line_column.append(line_id)
+            tags_column.append(tags_id)
+            children_column.append(0)
+            size_column.append(0)
+            path.append(indx)
+        count = len(line_column)
+        for parent in path:
+            size_column[parent] = count - parent - 1
+
+        encoded = [line.encode() for line in strings]
+        string_sizes = array("I", map(len, encoded))
+        blob_size = sum(string_sizes)
+
+        fp.write(_HEADER.pack(_MAGIC, _VERSION, _COMPRESSION[compression], 0))
+        out = cls._open_compressed(fp, compression, "wb")
+        try:
+            out.write(_COUNTS.pack(count, len(strings), len(tag_sets), len(tag_ids)))
+            cls._write_array(out, string_sizes)
+            out.writelines(encoded)
+            out.write(bytes(-blob_size % 4))
+            for column in (tag_sizes, tag_ids, line_column, tags_column, children_column, size_column):
+                cls._write_array(out, column)
+        finally:
+            if out is not fp:
+                out.close()
+
+    @classmethod
+    def load(cls, vendor: Vendor, fp: IO[bytes]) -> CTree:
+        """Чтение дерева, записанного dump, узлы создаются сразу, без промежуточных словарей.
+
+        Args:
+            vendor (Vendor): вендор, определяет класс узлов
+            fp (IO[bytes]): файл, открытый на чтение в бинарном режиме, не закрывается
+        """
+        _ct_class = CTreeFactory.get_class(vendor)
+        compression = cls._read_header(cls._read_exact(fp, _HEADER.size))
+        src = cls._open_compressed(fp, compression, "rb")
+        try:
+            count, strings_count, tag_sets_count, tag_ids_count = _COUNTS.unpack(cls._read_exact(src, _COUNTS.size))
+            string_sizes = cls._read_array(src, strings_count)
+            blob_size = sum(string_sizes)
+            blob = cls._read_exact(src, blob_size + -blob_size % 4)
+            strings = []
+            start = 0
+            for size in string_sizes:
+                strings.append(sys.intern(blob[start : start + size].decode()))
+                start += size
+            tag_sizes = cls._read_array(src, tag_sets_count)
+            tag_ids = cls._read_array(src, tag_ids_count)
+            tag_sets = []
+            start = 0
+            for size in tag_sizes:
+                tag_sets.append(TagSet.get(strings[tag_id] for tag_id in tag_ids[start : start + size]))
+                start += size
+            line_column = cls._read_array(src, count)
+            tags_column = cls._read_array(src, count)
+            _ = cls._read_array(src, count)
+            size_column = cls._read_array(src, count)
+        finally:
+            if src is not fp:
+                src.close()
+        if count == 0:
+            raise ValueError("CTree snapshot has no nodes")
+
+        root = _ct_class(line=strings[line_column[0]], tags=tag_sets[tags_column[0]])
+        # путь от корня до текущего родителя и индексы первых узлов после поддеревьев узлов пути
+        parents = [root]
+        ends = [count]
+        parent, end = root, count
+        columns = zip(line_column, tags_column, size_column, strict=True)
+        _ = next(columns)
+        for indx, (line_id, tags_id, size) in enumerate(columns, 1):
+            while end <= indx:
+                _ = parents.pop()
+                _ = ends.pop()
+                parent, end = parents[-1], ends[-1]
+            node = _ct_class(strings[line_id], parent, tag_sets[tags_id])
+            if size != 0:
+                parent, end = node, indx + size + 1
+                parents.append(parent)
+                ends.append(end)
+        return root
+
+    @staticmethod
+    def _read_header(data: bytes) -> str | None:
+        """Проверка заголовка бинарного формата, возвращает сжатие остальной части файла."""
+        magic, version, compression, _ = _HEADER.unpack(data)
+        if magic != _MAGIC:
+            raise ValueError("not a CTree snapshot")
+        if version != _VERSION:
+            raise ValueError(f"unsupported CTree snapshot version {version}")
+        for name, code in _COMPRESSION.items():
+            if code == compression:
+                return name
+        raise ValueError(f"unknown CTree snapshot compression {compression}")
+
+    @staticmethod
+    def _open_compressed(fp: IO[bytes], compression: str | None, mode: Literal["rb", "wb"]) -> IO[bytes]:
+        if compression is None:
+            return fp
+        if compression == "gzip":
+            return gzip.GzipFile(fileobj=fp, mode=mode)  # type: ignore[return-value]
+        try:
+            import zstandard  # type: ignore[import-not-found]
+        except ImportError as exc:
+            raise ImportError("zstd compression requires the zstandard package") from exc
+        if mode == "wb":
+            return zstandard.ZstdCompressor().stream_writer(fp, closefd=False)
+        return zstandard.ZstdDecompressor().stream_reader(fp, closefd=False)
+
+    @staticmethod
+    def _write_array(fp: IO[bytes], data: array[int]) -> None:
+        if sys.byteorder == "big":
+            data = array(data.typecode, data)
+            data.byteswap()
+        fp.write(data.tobytes())
+
+    @classmethod
+    def _read_array(cls, fp: IO[bytes], count: int) -> array[int]:
+        data = array("I")
+        data.frombytes(cls._read_exact(fp, count * data.itemsize))
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data
+
+    @staticmethod
+    def _read_exact(fp: IO[bytes], size: int) -> bytes:
+        data = fp.read(size)
+        while len(data) < size:
+            chunk = fp.read(size - len(data))
+            if len(chunk) == 0:
+                raise ValueError("CTree snapshot is truncated")
+            data += chunk
+        return data
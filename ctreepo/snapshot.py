@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import mmap
+import sys
+from array import array
+from itertools import accumulate
+from pathlib import Path
+from types import TracebackType
+from typing import Iterator, Sequence, Type
+
+from .abstract import CTree
+from .factory import CTreeFactory
+from .models import TagSet, Vendor
+from .serializer import _COUNTS, _HEADER, CTreeSerializer
+
+__all__ = (
+    "CTreeSnapshot",
+    "CTreeSnapshotNode",
+)
+
+
+class CTreeSnapshot:
+    """Дерево, записанное CTreeSerializer.dump без сжатия, с чтением по мере обращения.
+
+    Файл отображается в память (mmap), столбцы узлов читаются прямо из него. Узлы в файле лежат в
+    порядке обхода в глубину, поддерево узла i - это узлы i..i + размер поддерева, поэтому потомки
+    находятся без разбора остального дерева. Строки и наборы тегов декодируются при первом
+    обращении, узлы - при первом обращении к children родителя.
+
+    Узлы ссылаются на отображение файла, после close() обращаться к ним нельзя.
+    """
+
+    __slots__ = (
+        "_class",
+        "_mmap",
+        "_views",
+        "_string_offsets",
+        "_blob",
+        "_strings",
+        "_tag_offsets",
+        "_tag_ids",
+        "_tag_sets",
+        "_line_id",
+        "_tags_id",
+        "_children_count",
+        "_size",
+        "_masked_lines",
+        "_root",
+    )
+
+    def __init__(self, ct_class: Type[CTree], buffer: bytes | mmap.mmap) -> None:
+        self._class = ct_class
+        self._mmap: mmap.mmap | None = None
+        view = memoryview(buffer)
+        self._views = [view]
+        try:
+            count, strings_count, tag_sets_count = self._read_tables(view)
+        except Exception:
+            # срезы view удерживают buffer, без release его нельзя закрыть
+            self.close()
+            raise
+        self._strings: list[str | None] = [None] * strings_count
+        self._tag_sets: list[TagSet | None] = [None] * tag_sets_count
+        self._masked_lines: dict[int, str] = {}
+        self._root = CTreeSnapshotNode(self, 0, None)
+
+    def _read_tables(self, view: memoryview) -> tuple[int, int, int]:
+        """Разметка файла (см. формат в serializer.py), возвращает число узлов, строк и наборов тегов."""
+        if len(view) < _HEADER.size + _COUNTS.size:
+            raise ValueError("CTree snapshot is truncated")
+        if CTreeSerializer._read_header(bytes(view[: _HEADER.size])) is not None:
+            raise ValueError("compressed CTree snapshot can't be memory-mapped, use CTreeSerializer.load")
+        count, strings_count, tag_sets_count, tag_ids_count = _COUNTS.unpack_from(view, _HEADER.size)
+        if count == 0:
+            raise ValueError("CTree snapshot has no nodes")
+
+        offset = _HEADER.size + _COUNTS.size
+        string_sizes = self._column(view, offset, strings_count)
+        offset += 4 * strings_count
+        self._string_offsets = array("I", accumulate(string_sizes, initial=0))
+        blob_size = self._string_offsets[-1]
+        self._blob = self._slice(view, offset, blob_size)
+        offset += blob_size + -blob_size % 4
+        tag_sizes = self._column(view, offset, tag_sets_count)
+        offset += 4 * tag_sets_count
+        self._tag_offsets = array("I", accumulate(tag_sizes, initial=0))
+        self._tag_ids = self._column(view, offset, tag_ids_count)
+        offset += 4 * tag_ids_count
+        self._line_id = self._column(view, offset, count)
+        self._tags_id = self._column(view, offset + 4 * count, count)
+        self._children_count = self._column(view, offset + 8 * count, count)
+        self._size = self._column(view, offset + 12 * count, count)
+        return count, strings_count, tag_sets_count
+
+    @classmethod
+    def open(cls, vendor: Vendor, path: str | Path) -> CTreeSnapshot:
+        """Отображение файла снимка в память, дерево не читается до обращения к узлам."""
+        with open(path, "rb") as fp:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            snapshot = cls(CTreeFactory.get_class(vendor), buffer)
+        except Exception:
+            buffer.close()
+            raise
+        snapshot._mmap = buffer
+        return snapshot
+
+    def _slice(self, view: memoryview, offset: int, size: int) -> memoryview:
+        if offset + size > len(view):
+            raise ValueError("CTree snapshot is truncated")
+        data = view[offset : offset + size]
+        self._views.append(data)
+        return data
+
+    def _column(self, view: memoryview, offset: int, count: int) -> Sequence[int]:
+        column = self._slice(view, offset, 4 * count).cast("I")
+        self._views.append(column)
+        if sys.byteorder == "big":
+            data = array("I", column)
+            data.byteswap()
+            return data
+        return column
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self) -> CTreeSnapshot:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._line_id)
+
+    @property
+    def root(self) -> CTreeSnapshotNode:
+        return self._root
+
+    def _get_string(self, string_id: int) -> str:
+        string = self._strings[string_id]
+        if string is None:
+            data = self._blob[self._string_offsets[string_id] : self._string_offsets[string_id + 1]]
+            string = self._strings[string_id] = sys.intern(str(data, "utf-8"))
+        return string
+
+    def get_line(self, indx: int) -> str:
+        return self._get_string(self._line_id[indx])
+
+    def get_masked_line(self, indx: int) -> str:
+        line_id = self._line_id[indx]
+        masked = self._masked_lines.get(line_id)
+        if masked is None:
+            masked = self._masked_lines[line_id] = self._class.mask_line(self._get_string(line_id))
+        return masked
+
+    def get_tags(self, indx: int) -> list[str]:
+        tags_id = self._tags_id[indx]
+        tags = self._tag_sets[tags_id]
+        if tags is None:
+            tag_ids = self._tag_ids[self._tag_offsets[tags_id] : self._tag_offsets[tags_id + 1]]
+            tags = self._tag_sets[tags_id] = TagSet.get(self._get_string(tag_id) for tag_id in tag_ids)
+        return tags
+
+    def iter_children(self, indx: int) -> Iterator[int]:
+        child = indx + 1
+        for _ in range(self._children_count[indx]):
+            yield child
+            child += self._size[child] + 1
+
+    def iter_subtree(self, indx: int) -> Iterator[tuple[int, int]]:
+        """Узлы поддерева (включая сам узел) в порядке обхода в глубину: (индекс, глубина от узла)."""
+        # индексы первых узлов после поддеревьев узлов текущего пути, длина - глубина
+        ends: list[int] = []
+        for sub_indx in range(indx, indx + self._size[indx] + 1):
+            while len(ends) != 0 and ends[-1] <= sub_indx:
+                _ = ends.pop()
+            yield sub_indx, len(ends)
+            size = self._size[sub_indx]
+            if size != 0:
+                ends.append(sub_indx + size + 1)
+
+    def attach(self, indx: int, parent: CTree | None, *, children: bool) -> CTree:
+        """Узел indx в виде CTree, потомок parent, при children - вместе со всем поддеревом."""
+        node = self._class(line=self.get_line(indx), parent=parent, tags=self.get_tags(indx))
+        if children:
+            parents = [node]
+            for sub_indx, depth in self.iter_subtree(indx):
+                if depth == 0:
+                    continue
+                del parents[depth:]
+                node_line, node_tags = self.get_line(sub_indx), self.get_tags(sub_indx)
+                parents.append(self._class(line=node_line, parent=parents[-1], tags=node_tags))
+        return node
+
+    def to_ctree(self) -> CTree:
+        return self.attach(0, None, children=True)
+
+
+class CTreeSnapshotNode:
+    """Узел CTreeSnapshot с интерфейсом CTree для чтения.
+
+    Потомки декодируются при первом обращении к children и запоминаются в узле.
+    """
+
+    __slots__ = ("_snapshot", "_indx", "_parent", "_children")
+
+    def __init__(self, snapshot: CTreeSnapshot, indx: int, parent: CTreeSnapshotNode | None) -> None:
+        self._snapshot = snapshot
+        self._indx = indx
+        self._parent = parent
+        self._children: dict[str, CTreeSnapshotNode] | None = None
+
+    @property
+    def snapshot(self) -> CTreeSnapshot:
+        return self._snapshot
+
+    @property
+    def line(self) -> str:
+        return self._snapshot.get_line(self._indx)
+
+    @property
+    def masked_line(self) -> str:
+        return self._snapshot.get_masked_line(self._indx)
+
+    @property
+    def tags(self) -> list[str]:
+        return self._snapshot.get_tags(self._indx)
+
+    @property
+    def parent(self) -> CTreeSnapshotNode | None:
+        return self._parent
+
+    @property
+    def children(self) -> dict[str, CTreeSnapshotNode]:
+        if self._children is None:
+            snapshot = self._snapshot
+            self._children = {
+                snapshot.get_line(child): CTreeSnapshotNode(snapshot, child, self)
+                for child in snapshot.iter_children(self._indx)
+            }
+        return self._children
+
+    def _get_path(self) -> list[CTreeSnapshotNode]:
+        """Узлы от корня (не включая) до узла."""
+        path = []
+        node: CTreeSnapshotNode | None = self
+        while node is not None and node._parent is not None:
+            path.append(node)
+            node = node._parent
+        path.reverse()
+        return path
+
+    @property
+    def formal_path(self) -> str:
+        return " / ".join(node.line for node in self._get_path())
+
+    def _iter_config(self, masked: bool) -> Iterator[str]:
+        """Строки конфигурации узла, результат совпадает с CTree.config."""
+        snapshot = self._snapshot
+        # spaces/section_separator у CTree - свойства, у вендоров - атрибуты класса
+        proto = snapshot._class()
+        spaces, separator = proto.spaces, proto.section_separator
+        get_line = snapshot.get_masked_line if masked else snapshot.get_line
+        path = self._get_path()
+        for level, node in enumerate(path):
+            yield spaces * level + get_line(node._indx)
+        base = len(path) - 1
+        for child in snapshot.iter_children(self._indx):
+            for sub_indx, depth in snapshot.iter_subtree(child):
+                yield spaces * (base + depth + 1) + get_line(sub_indx)
+            if self._parent is None:
+                yield separator
+
+    @property
+    def config(self) -> str:
+        return "\n".join(self._iter_config(masked=False))
+
+    @property
+    def masked_config(self) -> str:
+        return "\n".join(self._iter_config(masked=True))
+
+    def _attach(self, children: bool) -> CTree:
+        """Копия узла вместе с цепочкой предков в новом дереве, возвращается сам узел."""
+        snapshot = self._snapshot
+        if self._parent is None:
+            return snapshot.attach(0, None, children=children)
+        node = snapshot.attach(0, None, children=False)
+        for path_node in self._get_path()[:-1]:
+            node = snapshot.attach(path_node._indx, node, children=False)
+        return snapshot.attach(self._indx, node, children=children)
+
+    @property
+    def patch(self) -> str:
+        return self._attach(children=True).patch
+
+    @property
+    def masked_patch(self) -> str:
+        return self._attach(children=True).masked_patch
+
+    def materialize(self, children: bool = True) -> CTree:
+        """Узел в виде CTree вместе с цепочкой предков, возвращается корень (аналог CTree.copy)."""
+        node = self._attach(children)
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def __str__(self) -> str:
+        return self.line
+
+    def __repr__(self) -> str:
+        return f"({id(self)}) '{self.line}'"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CTreeSnapshotNode):
+            return NotImplemented
+        return self._snapshot is other._snapshot and self._indx == other._indx
+
+    def __hash__(self) -> int:
+        return hash((id(self._snapshot), self._indx))
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from .abstract import CTree
+
+__all__ = (
+    "iter_postorder",
+    "iter_preorder",
+)
+
+# обходы с явным стеком: глубина дерева не ограничена sys.getrecursionlimit(), и на каждый
+# уровень не создается кадр стека Python
+
+
+def iter_preorder(root: CTree, include_root: bool = True) -> Iterator[tuple[CTree, int]]:
+    """Узлы поддерева в порядке обхода в глубину (родитель, затем потомки): (узел, глубина от root).
+
+    Потомки узла берутся после того, как узел отдан вызывающему, поэтому изменения
+    children выданного узла учитываются в дальнейшем обходе.
+    """
+    if include_root:
+        yield root, 0
+    stack = [(child, 1) for child in reversed(root._children.values())]
+    while len(stack) > 0:
+        node, depth = stack.pop()
+        yield node, depth
+        if len(node._children) != 0:
+            stack.extend((child, depth + 1) for child in reversed(node._children.values()))
+
+
+def iter_postorder(root: CTree, include_root: bool = True) -> Iterator[CTree]:
+    """Узлы поддерева, потомки раньше родителя.
+
+    Список потомков узла фиксируется при входе в узел, поэтому выданный узел можно удалить
+    (delete), на обход это не повлияет.
+    """
+    stack: list[tuple[CTree, Iterator[CTree]]] = [(root, iter(list(root._children.values())))]
+    while len(stack) > 0:
+        node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            _ = stack.pop()
+            if len(stack) != 0 or include_root:
+                yield node
+            continue
+        stack.append((child, iter(list(child._children.values()))))
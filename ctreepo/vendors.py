@@ -1,4 +1,5 @@
 import re
+from typing import Iterable, Iterator
 
 from .abstract import CTree
 
@@ -9,7 +10,21 @@ __all__ = (
 )
 
 
+def _with_next(lines: Iterable[str]) -> Iterator[tuple[str, bool]]:
+    """Строки и признак, что после строки в тексте есть перевод строки (за ней идет еще строка)."""
+    lines = iter(lines)
+    prev = next(lines, None)
+    if prev is None:
+        return
+    for line in lines:
+        yield prev, True
+        prev = line
+    yield prev, False
+
+
 class AristaCT(CTree):
+    __slots__ = ()
+
     spaces = "   "
     undo = "no"
     section_exit = "exit"
@@ -29,6 +44,8 @@ class AristaCT(CTree):
 
 
 class CiscoCT(CTree):
+    __slots__ = ()
+
     spaces = " "
     undo = "no"
     section_exit = "exit"
@@ -51,32 +68,32 @@ class CiscoCT(CTree):
         r".*secret (?:5|9|7) (\S+)",
     ]
     new_line_mask = "<<br>>"
+    _banner = re.compile(
+        r"banner (?P<type>(?:motd|login|exec)) (?P<sep>\S+)(?P<body>.*?)(?P=sep)\n",
+        re.DOTALL,
+    )
+    _banner_start = re.compile(r"banner (?:motd|login|exec) (?P<sep>\S+)")
+    _certificate = re.compile(
+        r"(?<=\s)certificate(?: ca| self-signed)? \S+\n(?P<body>.*?\s+quit)(?=\n)",
+        re.DOTALL,
+    )
+    _certificate_start = re.compile(r"(?:.*\s)?(?P<header>certificate(?: ca| self-signed)? \S+)")
+    _certificate_end = re.compile(r"(?:.*\s)?quit")
+
+    @classmethod
+    def _mask_body(cls, m: re.Match[str]) -> str:
+        # переводы строк маскируются только в найденном теле, а не во всех его вхождениях в конфигурацию
+        start, end = m.start("body") - m.start(), m.end("body") - m.start()
+        section = m.group()
+        return section[:start] + section[start:end].replace("\n", cls.new_line_mask) + section[end:]
 
     @classmethod
     def _mask_banners(cls, config: str) -> str:
-        banners = []
-        for section in re.finditer(
-            r"banner (?P<type>(?:motd|login|exec)) (?P<sep>\S+)(?P<body>.*?)(?P=sep)\n",
-            config,
-            re.DOTALL,
-        ):
-            banners.append(section.group("body"))
-        for banner in banners:
-            config = config.replace(banner, banner.replace("\n", cls.new_line_mask))
-        return config
+        return cls._banner.sub(cls._mask_body, config)
 
     @classmethod
     def _mask_certificates(cls, config: str) -> str:
-        certificates = []
-        for cert in re.finditer(
-            r"(?<=\s)certificate(?: ca| self-signed)? \S+\n(?P<body>.*?\s+quit)(?=\n)",
-            config,
-            re.DOTALL,
-        ):
-            certificates.append(cert.group("body"))
-        for certificate in certificates:
-            config = config.replace(certificate, certificate.replace("\n", cls.new_line_mask))
-        return config
+        return cls._certificate.sub(cls._mask_body, config)
 
     @classmethod
     def pre_run(cls, config: str) -> str:
@@ -84,6 +101,70 @@ class CiscoCT(CTree):
         config = cls._mask_certificates(config)
         return config
 
+    @classmethod
+    def pre_run_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        # как в pre_run: сначала баннеры по всему тексту, затем сертификаты в результате
+        return cls._mask_certificate_lines(cls._mask_banner_lines(lines))
+
+    @classmethod
+    def _mask_banner_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        # в памяти держим только текущий баннер, к нему применяем тот же regex, что и к тексту, блок
+        # собирается, как в "\n".join(lines): перевод строки в конце, только если за строкой есть еще
+        block: list[str] = []
+        prefix = ""  # часть первой строки до "banner", баннер ищется по всему тексту, а не с начала строки
+        sep = ""
+        for line, has_next in _with_next(lines):
+            if len(block) == 0:
+                m = cls._banner_start.search(line)
+                if m is None:
+                    yield line
+                    continue
+                prefix, sep = line[: m.start()], m.group("sep")
+                line = line[m.start() :]
+            block.append(line)
+            # regex выбирает самый длинный разделитель, для которого есть закрывающий,
+            # поэтому блок закрываем только по полному разделителю из первой строки
+            if len(block) > 1 and sep not in line:
+                continue
+            chunk = "\n".join(block) + ("\n" if has_next else "")
+            m = cls._banner.match(chunk)
+            if m is None or m.group("sep") != sep:
+                continue
+            text = prefix + cls._mask_banners(chunk)
+            yield from (text[:-1] if has_next else text).split("\n")
+            block = []
+        if len(block) != 0:
+            # полного разделителя так и не нашлось, тогда как в pre_run: до конца конфигурации
+            yield from (prefix + cls._mask_banners("\n".join(block))).split("\n")
+
+    @classmethod
+    def _mask_certificate_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        block: list[str] = []
+        # перевод строки перед заголовком, его видит (?<=\s) в regex, у первой строки текста его нет
+        prefix = ""
+        first = True
+        for line, has_next in _with_next(lines):
+            if len(block) == 0:
+                m = cls._certificate_start.fullmatch(line)
+                if m is None or (first and m.start("header") == 0):
+                    first = False
+                    yield line
+                    continue
+                prefix = "" if first else "\n"
+            first = False
+            block.append(line)
+            if not cls._certificate_end.fullmatch(line):
+                continue
+            chunk = prefix + "\n".join(block) + ("\n" if has_next else "")
+            # тело заканчивается первым quit с пробельным символом перед ним и переводом строки после
+            if cls._certificate.search(chunk) is None:
+                continue
+            text = cls._mask_certificates(chunk)[len(prefix) :]
+            yield from (text[:-1] if has_next else text).split("\n")
+            block = []
+        # незакрытый блок regex не меняет
+        yield from block
+
     def post_run(self) -> None:
         for node in self.children.values():
             if node.line.startswith(("banner motd", "banner exec", "banner login")):
@@ -97,6 +178,8 @@ class CiscoCT(CTree):
 
 
 class HuaweiCT(CTree):
+    __slots__ = ()
+
     spaces = " "
     undo = "undo"
     section_exit = "quit"
@@ -122,6 +205,26 @@ class HuaweiCT(CTree):
         r".*pass-phrase (\S+) aes",
     ]
 
+    _global_commands = r"""(
+                ntp-service\s
+                |np\scapwap-reassembly\s
+                |set\snp\srss\s
+                |clock\stimezone\s
+                |http\stimeout\s
+                |http\sserver\s
+                |http\ssecure-server\s
+                |defence\sengine\s
+                |sysname\s
+                |header\sshell\sinformation\s
+                |snmp-agent\s?
+                |info-center\s
+                |ssh\s(?:server|client)
+                |(?:undo\s)?s?telnet\s
+                |ftp\s
+                )"""
+    _indented_global = re.compile(r"\n\s+" + _global_commands, re.VERBOSE)
+    _global_command = re.compile(_global_commands, re.VERBOSE)
+
     @classmethod
     def _remove_spaces(cls, config: str) -> str:
         # у huawei в некоторых устройствах/версиях некоторые глобальные команды
@@ -141,30 +244,32 @@ class HuaweiCT(CTree):
         # поэтому удаляем пробел из конфигурации перед анализом
         #! то, что встретилось, возможно есть еще какие-то случаи
 
-        return re.sub(
-            pattern=r"""\n\s+(
-                ntp-service\s
-                |np\scapwap-reassembly\s
-                |set\snp\srss\s
-                |clock\stimezone\s
-                |http\stimeout\s
-                |http\sserver\s
-                |http\ssecure-server\s
-                |defence\sengine\s
-                |sysname\s
-                |header\sshell\sinformation\s
-                |snmp-agent\s?
-                |info-center\s
-                |ssh\s(?:server|client)
-                |(?:undo\s)?s?telnet\s
-                |ftp\s
-                )""",
-            repl=r"\n\g<1>",
-            string=config,
-            flags=re.VERBOSE,
-        )
+        return cls._indented_global.sub(r"\n\g<1>", config)
 
     @classmethod
     def pre_run(cls, config: str) -> str:
         config = cls._remove_spaces(config)
         return config
+
+    @classmethod
+    def pre_run_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        # повторяет _indented_global.sub для "\n".join(lines): замена начинается с перевода строки,
+        # за которым идут пробельные символы (отступ строки или пустые строки), а \s после команды
+        # без аргументов забирает перевод строки в конце строки, тогда следующая строка не сдвигается
+        newline = False  # перед строкой есть перевод строки, не занятый предыдущей заменой
+        spaces = False  # между этим переводом строки и строкой есть пустые строки
+        for line, has_next in _with_next(lines):
+            command = line.lstrip()
+            if len(command) == 0:
+                spaces = newline
+                newline = newline or has_next
+                yield line
+                continue
+            m = cls._global_command.match(command + ("\n" if has_next else ""))
+            if newline and (spaces or len(command) != len(line)) and m is not None:
+                yield command
+                newline = has_next and m.end() <= len(command)
+            else:
+                yield line
+                newline = has_next
+            spaces = False
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+from .abstract import CTree
+
+__all__ = ("CTreeView",)
+
+
+class _CTreeSelection:
+    """Выбранные узлы исходного дерева.
+
+    visible - узлы, которые попадают в результат (найденные узлы и все их предки), full - найденные
+    узлы, которые попадают в результат вместе со всеми потомками (include_children=True).
+    """
+
+    __slots__ = ("visible", "full")
+
+    def __init__(self) -> None:
+        self.visible: dict[int, CTree] = {}
+        self.full: set[int] = set()
+
+    def add(self, node: CTree, children: bool) -> None:
+        if children:
+            self.full.add(id(node))
+        current: CTree | None = node
+        while current is not None and id(current) not in self.visible:
+            self.visible[id(current)] = current
+            current = current.parent
+
+    def is_full(self, node: CTree) -> bool:
+        """Входит ли все поддерево узла в результат (узел или его предок найден с потомками)."""
+        current: CTree | None = node
+        while current is not None:
+            if id(current) in self.full:
+                return True
+            current = current.parent
+        return False
+
+    def iter_children(self, node: CTree, full: bool) -> Iterator[tuple[CTree, bool]]:
+        """Выбранные потомки узла: (потомок, входит ли все его поддерево в результат)."""
+        if full:
+            for child in node._children.values():
+                yield child, True
+        else:
+            for child in node._children.values():
+                if id(child) in self.visible:
+                    yield child, id(child) in self.full
+
+
+class CTreeView:
+    """Результат поиска без копирования узлов (CTreeSearcher.search(view=True)).
+
+    Хранит ссылки на узлы исходного дерева и список выбранных узлов, интерфейс для чтения как у
+    CTree. Изменения исходного дерева видны через view, если нужно независимое дерево - materialize().
+    """
+
+    __slots__ = ("_node", "_selection", "_full")
+
+    def __init__(self, node: CTree, selection: _CTreeSelection, full: bool = False) -> None:
+        self._node = node
+        self._selection = selection
+        self._full = full
+
+    @classmethod
+    def from_nodes(cls, root: CTree, nodes: Iterable[CTree], include_children: bool = False) -> CTreeView:
+        """View корня root, в который попадают узлы nodes (вместе с потомками при include_children)."""
+        while root.parent is not None:
+            root = root.parent
+        selection = _CTreeSelection()
+        selection.visible[id(root)] = root
+        for node in nodes:
+            selection.add(node, include_children)
+        return cls(root, selection, selection.is_full(root))
+
+    @property
+    def node(self) -> CTree:
+        return self._node
+
+    @property
+    def line(self) -> str:
+        return self._node.line
+
+    @property
+    def masked_line(self) -> str:
+        return self._node.masked_line
+
+    @property
+    def tags(self) -> list[str]:
+        return self._node.tags
+
+    @property
+    def parent(self) -> CTreeView | None:
+        parent = self._node.parent
+        if parent is None:
+            return None
+        return CTreeView(parent, self._selection, self._selection.is_full(parent))
+
+    @property
+    def children(self) -> dict[str, CTreeView]:
+        return {
+            child._line: CTreeView(child, self._selection, full)
+            for child, full in self._selection.iter_children(self._node, self._full)
+        }
+
+    @property
+    def formal_path(self) -> str:
+        return self._node.formal_path
+
+    def _iter_config(self, masked: bool) -> Iterator[str]:
+        """Строки конфигурации, результат совпадает с materialize().config."""
+        node = self._node
+        path_to_root = []
+        current = node
+        while current.parent is not None:
+            path_to_root.append(current.masked_line if masked else current.line)
+            current = current.parent
+        path_to_root.reverse()
+        for indx, line in enumerate(path_to_root):
+            yield node.spaces * indx + line
+
+        base = len(path_to_root)
+        iter_children = self._selection.iter_children
+        for child, full in iter_children(node, self._full):
+            yield node.spaces * base + (child.masked_line if masked else child._line)
+            stack = [iter_children(child, full)]
+            while len(stack) > 0:
+                item = next(stack[-1], None)
+                if item is None:
+                    _ = stack.pop()
+                    continue
+                current, current_full = item
+                yield node.spaces * (base + len(stack)) + (current.masked_line if masked else current._line)
+                if len(current._children) != 0:
+                    stack.append(iter_children(current, current_full))
+            if node.parent is None:
+                yield node.section_separator
+
+    @property
+    def config(self) -> str:
+        return "\n".join(self._iter_config(masked=False))
+
+    @property
+    def masked_config(self) -> str:
+        return "\n".join(self._iter_config(masked=True))
+
+    @property
+    def patch(self) -> str:
+        return self.materialize().patch
+
+    @property
+    def masked_patch(self) -> str:
+        return self.materialize().masked_patch
+
+    def materialize(self) -> CTree:
+        """Копия выбранной части дерева, возвращается корень (аналог CTree.copy)."""
+        chain = []
+        current: CTree | None = self._node
+        while current is not None:
+            chain.append(current)
+            current = current.parent
+        chain.reverse()
+
+        root_class = chain[0].__class__
+        root = new_node = root_class()
+        for node in chain[1:]:
+            new_node = root_class(line=node.line, parent=new_node, tags=node._tags.copy())
+
+        stack = [(new_node, self._selection.iter_children(self._node, self._full))]
+        while len(stack) > 0:
+            parent, children = stack[-1]
+            item = next(children, None)
+            if item is None:
+                _ = stack.pop()
+                continue
+            child, full = item
+            if full:
+                _ = child._copy(children=True, parent=parent)
+            else:
+                new_child = root_class(line=child.line, parent=parent, tags=child._tags.copy())
+                stack.append((new_child, self._selection.iter_children(child, False)))
+        return root
+
+    def __str__(self) -> str:
+        return self.line
+
+    def __repr__(self) -> str:
+        return f"({id(self)}) '{self.line}'"
@@ -1,12 +1,13 @@
 """Тесты абстрактного класса на примере Huawei."""
 
 from collections import deque
+from io import StringIO
 from pathlib import Path
 from textwrap import dedent
 
 import pytest
 
-from ctreepo import CTree, CTreeParser, HuaweiCT, TaggingRulesFile, Vendor
+from ctreepo import AristaCT, CTree, CTreeParser, CTreeSerializer, HuaweiCT, TaggingRulesFile, Vendor
 
 
 @pytest.fixture(scope="function")
@@ -186,6 +187,19 @@ def test_masked_config(huawei_manual_config: dict[str, CTree]) -> None:
     assert root.masked_config == masked_config
 
 
+@pytest.mark.parametrize("masked", [False, True])
+@pytest.mark.parametrize("node", ["root", "lan", "ipv4_af_lan", "rd_lan", "radius"])
+def test_write_config(huawei_manual_config: dict[str, CTree], node: str, masked: bool) -> None:
+    ct = huawei_manual_config[node]
+    fp = StringIO()
+    ct.write_config(fp, masked=masked)
+    assert fp.getvalue() == (ct.masked_config if masked else ct.config)
+
+    fp = StringIO()
+    HuaweiCT().write_config(fp)
+    assert fp.getvalue() == ""
+
+
 def test_patch(huawei_manual_config: dict[str, CTree]) -> None:
     patch = dedent(
         """
@@ -223,6 +237,15 @@ def test_patch(huawei_manual_config: dict[str, CTree]) -> None:
     assert root.patch == patch
 
 
+@pytest.mark.parametrize("masked", [False, True])
+@pytest.mark.parametrize("node", ["root", "lan", "ipv4_af_lan", "rd_lan", "radius"])
+def test_write_patch(huawei_manual_config: dict[str, CTree], node: str, masked: bool) -> None:
+    ct = huawei_manual_config[node]
+    fp = StringIO()
+    ct.write_patch(fp, masked=masked)
+    assert fp.getvalue() == (ct.masked_patch if masked else ct.patch)
+
+
 def test_masked_patch(huawei_manual_config: dict[str, CTree]) -> None:
     masked_patch = dedent(
         f"""
@@ -429,6 +452,130 @@ def test_mask_line(huawei_manual_config: dict[str, CTree]) -> None:
         assert node.masked_line == masked
 
 
+def test_formal_path(huawei_manual_config: dict[str, CTree]) -> None:
+    rd = huawei_manual_config["rd_lan"]
+    af = huawei_manual_config["ipv4_af_lan"]
+    assert rd.formal_path == "ip vpn-instance LAN / ipv4-family / route-distinguisher 192.168.0.1:123"
+    assert rd.formal_path is rd.formal_path
+    assert rd._formal_path == ["ip vpn-instance LAN", "ipv4-family", "route-distinguisher 192.168.0.1:123"]
+
+    huawei_manual_config["lan"].line = "ip vpn-instance WAN"
+    assert rd.formal_path == "ip vpn-instance WAN / ipv4-family / route-distinguisher 192.168.0.1:123"
+
+    af.parent = huawei_manual_config["mgmt"]
+    assert af.formal_path == "ip vpn-instance MGMT / ipv4-family"
+    assert rd.formal_path == "ip vpn-instance MGMT / ipv4-family / route-distinguisher 192.168.0.1:123"
+    assert huawei_manual_config["root"].formal_path == ""
+
+
+def test_content_hash(huawei_manual_config: dict[str, CTree]) -> None:
+    root = huawei_manual_config["root"]
+    other = root.copy()
+    assert root.content_hash == other.content_hash
+    assert root == other
+
+    lan = huawei_manual_config["lan"]
+    lan_hash = lan.content_hash
+    root_hash = root.content_hash
+    huawei_manual_config["rt_export"].line = "vpn-target 1:1 export-extcommunity evpn"
+    assert lan.content_hash != lan_hash
+    assert root.content_hash != root_hash
+    assert huawei_manual_config["mgmt"].content_hash == other.children["ip vpn-instance MGMT"].content_hash
+
+    root_hash = root.content_hash
+    _ = HuaweiCT("vxlan vni 321", lan)
+    assert root.content_hash != root_hash
+
+    root_hash = root.content_hash
+    huawei_manual_config["vxlan"].delete()
+    assert root.content_hash != root_hash
+
+    root_hash = root.content_hash
+    huawei_manual_config["sflow"].tags = ["sflow"]
+    assert root.content_hash != root_hash
+
+    # порядок потомков учитывается в хеше, но не в сравнении
+    # (line меняет строку узла, но не ключ в children родителя, поэтому сравниваются копии)
+    root = root.copy()
+    other = root.copy()
+    other.children = dict(reversed(other.children.items()))
+    assert root.content_hash != other.content_hash
+    assert root == other
+
+    # совпадение хешей (коллизия или устаревший кеш) не делает разные деревья равными
+    other = root.copy()
+    _ = root.content_hash, other.content_hash
+    other.children["ip vpn-instance LAN"].children["vxlan vni 321"].tags = ["vxlan"]
+    other._content_hash = root.content_hash
+    assert root != other
+
+    # изменения на месте тоже сбрасывают кеш
+    other = root.copy()
+    _ = other.content_hash
+    other.children["sflow collector 1 ip 100.64.0.1 vpn-instance MGMT"].tags.append("sflow-2")
+    assert root.content_hash != other.content_hash
+    assert root != other
+    other = root.copy()
+    _ = other.content_hash
+    del other.children["ip vpn-instance LAN"].children["vxlan vni 321"]
+    assert root.content_hash != other.content_hash
+    other.children["ip vpn-instance LAN"].children.clear()
+    other_hash = other.content_hash
+    other.children["ip vpn-instance LAN"].children |= root.children["ip vpn-instance LAN"].children
+    assert other.content_hash != other_hash
+
+
+def test_profile() -> None:
+    profile = HuaweiCT.get_profile()
+    assert profile is HuaweiCT.get_profile()
+    assert profile is not AristaCT.get_profile()
+    assert profile.junk_lines is not None
+    assert profile.junk_lines.fullmatch(" #")
+    assert profile.sections_without_exit is not None
+    assert profile.sections_without_exit.fullmatch("xpl route-filter RP_XPL_BLOCK")
+    assert AristaCT.get_profile().sections_without_exit is None
+
+
+def test_masked_line() -> None:
+    node = HuaweiCT("local-user admin password irreversible-cipher secret-1", HuaweiCT())
+    assert node.masked_line == f"local-user admin password irreversible-cipher {HuaweiCT.masking_string}"
+    assert node.masked_line is node.masked_line
+    node.line = "local-user admin privilege level 3"
+    assert node.masked_line == "local-user admin privilege level 3"
+
+
+def test_masked_index() -> None:
+    root = HuaweiCT()
+    aaa = HuaweiCT("aaa", root)
+    user = HuaweiCT("local-user admin password irreversible-cipher secret-1", aaa)
+    _ = HuaweiCT("local-user admin password irreversible-cipher secret-2", aaa)
+    target = HuaweiCT("local-user admin password irreversible-cipher other", HuaweiCT())
+    assert target.exists_in(aaa, masked=True) == user.line
+    assert aaa._masked_index is not None
+
+    user.line = "local-user admin privilege level 3"
+    assert aaa._masked_index is None
+    aaa.rebuild()
+    assert target.exists_in(aaa, masked=True) == "local-user admin password irreversible-cipher secret-2"
+
+    aaa.children["local-user admin password irreversible-cipher secret-2"].delete()
+    assert target.exists_in(aaa, masked=True) == ""
+    _ = HuaweiCT("local-user admin password irreversible-cipher secret-3", aaa)
+    assert target.exists_in(aaa, masked=True) == "local-user admin password irreversible-cipher secret-3"
+    aaa.children = {}
+    assert target.exists_in(aaa, masked=True) == ""
+
+    # изменения children на месте тоже сбрасывают индекс
+    _ = HuaweiCT("local-user admin password irreversible-cipher secret-4", aaa)
+    assert target.exists_in(aaa, masked=True) == "local-user admin password irreversible-cipher secret-4"
+    del aaa.children["local-user admin password irreversible-cipher secret-4"]
+    assert target.exists_in(aaa, masked=True) == ""
+    aaa.children["local-user admin password irreversible-cipher secret-5"] = HuaweiCT(
+        "local-user admin password irreversible-cipher secret-5"
+    )
+    assert target.exists_in(aaa, masked=True) == "local-user admin password irreversible-cipher secret-5"
+
+
 def test_nested_config(huawei_manual_config: dict[str, CTree]) -> None:
     config = dedent(
         """
@@ -841,3 +988,12 @@ def test_apply() -> None:
     diff = parser.parse(diff_config)
     target = current.apply(diff)
     assert target.config == target_config
+
+    current_dict = CTreeSerializer.to_dict(current)
+    target_view = current.apply_view(diff)
+    assert target_view.config == target_config
+    assert target_view == target
+    assert CTreeSerializer.to_dict(current) == current_dict
+    # нетронутые поддеревья не копируются
+    assert target_view.children["line 11"] is current.children["line 11"]
+    assert target_view.children["section 2"] is diff.children["section 2"]
@@ -0,0 +1,138 @@
+from textwrap import dedent
+from typing import Any
+
+import pytest
+
+from ctreepo import (
+    CTree,
+    CTreeArena,
+    CTreeArenaNode,
+    CTreeDiffer,
+    CTreeParser,
+    CTreeSearcher,
+    CTreeSerializer,
+    HuaweiCT,
+    TaggingRulesDict,
+    Vendor,
+)
+
+config = dedent(
+    """
+    sflow collector 1 ip 100.64.0.1 vpn-instance MGMT
+    #
+    ip vpn-instance MGMT
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+    #
+    ip vpn-instance LAN
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+      vpn-target 123:123 export-extcommunity evpn
+      vpn-target 123:123 import-extcommunity evpn
+     vxlan vni 123
+    #
+    interface gi0/0/0
+     ip address 1.1.1.1 255.255.255.252
+    #
+    interface gi0/0/1
+     ip address 1.1.1.1 255.255.255.252
+    #
+    radius-server template RADIUS_TEMPLATE
+     radius-server shared-key cipher secret_password
+     radius-server algorithm loading-share
+    #
+    xpl route-filter RP_XPL_BLOCK
+     drop
+     end-filter
+    #
+    """
+).strip()
+
+
+@pytest.fixture(scope="session")
+def get_parser() -> CTreeParser:
+    tagging_rules_dict: dict[Vendor, list[dict[str, str | list[str]]]] = {
+        Vendor.HUAWEI: [
+            {"regex": r"^ip vpn-instance (\S+)$", "tags": ["vpn"]},
+            {"regex": r"^ip vpn-instance (\S+) .* export-extcommunity evpn", "tags": ["rt"]},
+            {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+            {"regex": r"^interface (gi0/0/0) .* ip address \S+ \S+$", "tags": ["ip", "interface-1"]},
+            {"regex": r"^interface (gi0/0/1) .* ip address \S+ \S+$", "tags": ["ip", "interface-2"]},
+        ],
+    }
+    return CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=TaggingRulesDict(tagging_rules_dict))
+
+
+def test_structure(get_parser: CTreeParser) -> None:
+    arena = get_parser.parse_arena(config)
+    ct = get_parser.parse(config)
+    assert len(arena) == len(CTreeSerializer.to_records(ct))
+    assert arena.nbytes == len(arena) * 5 * 4
+    assert arena.to_ctree() == ct
+    assert CTreeSerializer.to_records(arena) == CTreeSerializer.to_records(ct)
+    assert CTreeSerializer.to_dict(arena) == CTreeSerializer.to_dict(ct)
+    assert CTreeArena.from_records(Vendor.HUAWEI, arena.to_records()).to_records() == arena.to_records()
+
+    # одинаковые строки хранятся один раз
+    assert arena._lines.count("ipv4-family") == 1
+    assert arena._lines.count("ip address 1.1.1.1 255.255.255.252") == 1
+
+
+def test_view(get_parser: CTreeParser) -> None:
+    arena = get_parser.parse_arena(config)
+    ct = get_parser.parse(config)
+    stack: list[tuple[CTree, CTreeArenaNode]] = [(ct, arena.root)]
+    while len(stack) > 0:
+        node, view = stack.pop()
+        assert view.line == node.line
+        assert view.tags == node.tags
+        assert view.formal_path == node.formal_path
+        assert view.config == node.config
+        assert view.masked_config == node.masked_config
+        assert view.patch == node.patch
+        assert view.masked_patch == node.masked_patch
+        assert view.materialize().config == node.copy().config
+        assert list(view.children) == list(node.children)
+        if node.parent is None:
+            assert view.parent is None
+        else:
+            assert view.parent is not None
+            assert view.parent.line == node.parent.line
+        stack.extend(zip(node.children.values(), view.children.values(), strict=True))
+
+    lan = arena.root.children["ip vpn-instance LAN"]
+    assert lan == arena.root.children["ip vpn-instance LAN"]
+    assert lan != arena.root.children["ip vpn-instance MGMT"]
+    assert isinstance(lan.materialize(children=False), HuaweiCT)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"string": "ipv4-family"},
+        {"string": "ipv4-family", "include_children": True},
+        {"string": "vpn-instance", "exclude_tags": ["rt"]},
+        {"include_tags": ["interface-1", "interface-2"]},
+        {"include_tags": ["ip", "interface-1"], "include_mode": "and"},
+        {"string": "", "include_tags": ["vpn"], "include_children": True},
+        {"string": ".*"},
+        {"string": "not-found"},
+        {},
+    ],
+)
+def test_search(get_parser: CTreeParser, kwargs: dict[str, Any]) -> None:
+    arena = get_parser.parse_arena(config)
+    ct = get_parser.parse(config)
+    expected = CTreeSearcher.search(ct, **kwargs)
+    result = CTreeSearcher.search(arena, **kwargs)
+    assert result == expected
+    assert result.config == expected.config
+    assert CTreeSerializer.to_records(result) == CTreeSerializer.to_records(expected)
+
+
+def test_diff(get_parser: CTreeParser) -> None:
+    target = config.replace("vxlan vni 123", "vxlan vni 456").replace(" drop", " approve")
+    diff = CTreeDiffer.diff(get_parser.parse(config), get_parser.parse(target))
+    arena_diff = CTreeDiffer.diff(get_parser.parse_arena(config), get_parser.parse_arena(target))
+    assert arena_diff.config == diff.config
+    assert arena_diff.config != ""
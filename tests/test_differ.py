@@ -1,3 +1,4 @@
+import re
 from textwrap import dedent
 
 import pytest
@@ -475,6 +476,47 @@ def test_ordered_root() -> None:
     assert ordered_diff.config == ordered_diff_config
 
 
+def test_ordered_insert() -> None:
+    # в секцию с порядком строку можно только дописать в конец, поэтому сохраняем
+    # совпадающее начало секции, а хвост после места вставки удаляем и добавляем заново
+    current_config = dedent(
+        """
+        acl number 3000
+         rule 1
+         rule 2
+         rule 3
+         rule 4
+        """
+    ).strip()
+    target_config = dedent(
+        """
+        acl number 3000
+         rule 1
+         rule 2
+         rule 5
+         rule 3
+         rule 4
+        """
+    ).strip()
+    diff_config = dedent(
+        """
+        acl number 3000
+         undo rule 3
+         undo rule 4
+         rule 5
+         rule 3
+         rule 4
+        #
+        """
+    ).strip()
+    parser = CTreeParser(Vendor.HUAWEI)
+    current = parser.parse(current_config)
+    target = parser.parse(target_config)
+    diff = CTreeDiffer.diff(current, target, ordered_sections=[r"^acl number \d+$"])
+    assert diff.config == diff_config
+    assert current.apply(diff).config == target.config
+
+
 def test_no_diff_sections() -> None:
     current_config = dedent(
         """
@@ -696,3 +738,55 @@ def test_double_undo() -> None:
     target = parser.parse(target_config)
     diff = CTreeDiffer.diff(current, target)
     assert diff.config == diff_config
+
+
+@pytest.mark.parametrize(
+    "sections, count",
+    [
+        ([], 0),
+        ([r"^acl number \d+$", r"^route-policy \S+ \S+ node \d+$"], 1),
+        # флаги не в начале общего regex'a не компилируются, а ссылки на группы поменяли бы смысл
+        ([r"^acl number \d+$", r"(?i)^IP IP-PREFIX"], 2),
+        ([r"^acl number \d+$", r"^(\S+) \1$"], 2),
+        # в общем regex'e (?(1)...) ссылалась бы на группу первого шаблона
+        ([r"^(acl) number \d+$", r"^(test)? ?(?(1)test|route-policy)"], 2),
+        ([r"^acl number \d+$", r"^(?P<name>test)? ?(?(name)test|route-policy)"], 2),
+    ],
+)
+def test_section_matchers(sections: list[str], count: int) -> None:
+    matchers = CTreeDiffer._get_matchers(sections)
+    assert len(matchers) == count
+    assert CTreeDiffer._get_matchers(sections) is matchers
+    for path in (
+        "acl number 3000",
+        "acl number 3000 / rule 5 permit",
+        "route-policy RP_NAME permit node 10",
+        "ip ip-prefix PL_NAME index 10 permit 10.0.0.0 8",
+        "test test",
+    ):
+        reference = any(re.search(section, path) for section in sections)
+        assert CTreeDiffer._check_sections(path, matchers) is reference
+
+
+def test_diff_after_inplace_change() -> None:
+    # кеши поддеревьев от прошлого diff не должны скрывать изменения children на месте
+    parser = CTreeParser(Vendor.HUAWEI)
+    config = "interface x\n undo shutdown\n#"
+    a = parser.parse(config)
+    b = parser.parse(config)
+    assert CTreeDiffer.diff(a, b).config == ""
+    del b.children["interface x"].children["undo shutdown"]
+    expected = CTreeDiffer.diff(a, parser.parse("interface x\n#")).config
+    assert expected == "interface x\n shutdown\n#"
+    assert CTreeDiffer.diff(a, b).config == expected
+
+
+def test_masked_diff_after_inplace_change() -> None:
+    parser = CTreeParser(Vendor.HUAWEI)
+    a = parser.parse("radius-server template R\n radius-server shared-key cipher s1\n#")
+    b = parser.parse("radius-server template R\n radius-server shared-key cipher s2\n#")
+    assert CTreeDiffer.diff(a, b, masked=True).config == ""
+    del b.children["radius-server template R"].children["radius-server shared-key cipher s2"]
+    expected = CTreeDiffer.diff(a, parser.parse("radius-server template R\n#"), masked=True).config
+    assert expected != ""
+    assert CTreeDiffer.diff(a, b, masked=True).config == expected
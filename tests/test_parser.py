@@ -1,9 +1,25 @@
+import gc
+import pickle
+import re
+import weakref
+from io import StringIO
 from pathlib import Path
 from textwrap import dedent
 
 import pytest
 
-from ctreepo import CTreeParser, TaggingRule, TaggingRules, TaggingRulesDict, TaggingRulesFile, Vendor
+from ctreepo import (
+    CTree,
+    CTreeParser,
+    CTreeSerializer,
+    CTreeTagger,
+    TaggingRule,
+    TaggingRules,
+    TaggingRulesDict,
+    TaggingRulesFile,
+    TagSet,
+    Vendor,
+)
 
 huawei_config = dedent(
     """
@@ -215,6 +231,213 @@ def test_tags(get_dict_loader: TaggingRules) -> None:
     assert len(ip.tags) == 3
 
 
+def test_interning() -> None:
+    config = dedent(
+        """
+        interface gi0/0/0
+         undo shutdown
+        #
+        interface gi0/0/1
+         undo shutdown
+        #
+        """
+    ).strip()
+    rules: dict[Vendor, list[dict[str, str | list[str]]]] = {
+        Vendor.HUAWEI: [{"regex": r"^interface \S+ / undo shutdown$", "tags": ["enabled"]}],
+    }
+    parser = CTreeParser(Vendor.HUAWEI, TaggingRulesDict(rules))
+    roots = [parser.parse(config), parser.parse(config)]
+    nodes = [root.children[f"interface gi0/0/{indx}"].children["undo shutdown"] for root in roots for indx in (0, 1)]
+    assert all(node.line is nodes[0].line for node in nodes)
+    assert all(node._tags is nodes[0]._tags for node in nodes)
+    assert isinstance(nodes[0]._tags, TagSet)
+    with pytest.raises(TypeError):
+        nodes[0]._tags.append("disabled")
+
+    # теги меняются на месте, как у обычного списка: узел получает свою копию набора
+    nodes[0].tags.append("disabled")
+    assert type(nodes[0]._tags) is list
+    assert nodes[0].tags == ["enabled", "disabled"]
+    assert all(node._tags is nodes[1]._tags for node in nodes[1:])
+    assert nodes[1]._tags == ["enabled"]
+
+    # копия узла получает обычный список тегов
+    copied = nodes[1].copy().children["interface gi0/0/1"].children["undo shutdown"]
+    assert type(copied._tags) is list
+    copied.tags.append("copied")
+    assert nodes[1]._tags == ["enabled"]
+
+    records = pickle.loads(pickle.dumps(CTreeSerializer.to_records(roots[1])))  # noqa: S301
+    restored = CTreeSerializer.from_records(Vendor.HUAWEI, records)
+    assert restored.children["interface gi0/0/1"].children["undo shutdown"]._tags is nodes[1]._tags
+
+
+def test_tagger() -> None:
+    rules = [
+        TaggingRule(regex=r"^interface (\S+) / description", tags=["description"]),
+        TaggingRule(regex=r"shutdown$", tags=["shutdown"]),
+        TaggingRule(regex=r"^interface (\S+)", tags=["interface"]),
+        TaggingRule(regex=r"^interf(?:ace)? (\S+) / ip address", tags=["never"]),
+        TaggingRule(regex=r"^ip vpn-instance (\S+)|^vpn-instance (\S+)", tags=["vpn"]),
+        TaggingRule(regex=r"^ntp-service", tags=["ntp"]),
+    ]
+    tagger = CTreeTagger(rules)
+    lines = {
+        "interface gi0/0/0": ["interface", "gi0/0/0"],
+        "interface gi0/0/0 / description test": ["description", "gi0/0/0"],
+        "interface gi0/0/0 / shutdown": ["shutdown"],
+        "interface gi0/0/0 / ip address 1.1.1.1 255.255.255.0": ["interface", "gi0/0/0"],
+        "ip vpn-instance LAN": ["vpn", "LAN", None],
+        "vpn-instance LAN": ["vpn", None, "LAN"],
+        "ntp-service enable": ["ntp"],
+        "ntp-service-disable": ["ntp"],
+        "sysname test": None,
+    }
+    assert len(tagger) == len(rules)
+    for line, tags in lines.items():
+        assert tagger.get_tags(line) == tags
+        # тот же результат, что и последовательный перебор правил
+        for rule in rules:
+            if m := re.search(rule.regex, line):
+                assert tags == [*rule.tags, *m.groups()]
+                break
+        else:
+            assert tags is None
+
+
+def test_parse_stream(tmp_path: Path, get_dict_loader: TaggingRules) -> None:
+    parser = CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=get_dict_loader)
+    expected = CTreeSerializer.to_dict(parser.parse(huawei_config))
+    assert CTreeSerializer.to_dict(parser.parse_stream(huawei_config.splitlines())) == expected
+    assert CTreeSerializer.to_dict(parser.parse_stream(StringIO(huawei_config))) == expected
+    config_file = tmp_path / "huawei.txt"
+    config_file.write_text(huawei_config)
+    assert CTreeSerializer.to_dict(parser.parse_stream(config_file)) == expected
+    assert CTreeSerializer.to_dict(parser.parse_stream(str(config_file))) == expected
+
+
+@pytest.mark.parametrize(
+    "vendor, config",
+    [
+        (
+            Vendor.HUAWEI,
+            """
+            sysname test
+            #
+             ntp-service server disable
+             ntp-service unicast-server 1.2.3.4
+            #
+            interface gi0/0/0
+             description test
+             undo telnet server enable
+            #
+            """,
+        ),
+        (
+            Vendor.CISCO,
+            """
+            hostname test
+            !
+            banner exec $$
+            ====
+              exec banner
+            ====
+            $(hostname).$(domain), line $(line)
+            $$
+            !
+            banner motd ^C motd banner ^C
+            banner login ^C
+            login banner
+            ^C
+            !
+            crypto pki certificate chain TP_NAME
+             certificate ca 1234ABCD
+              30820378 30820260 A0030201 02021017 16449497 577B9F48 1ED1DB4F 4D01F430
+              0D06092A 864886F7 0D010105 0500303C 310B3009 06035504 06130252 55311230
+                    quit
+            !
+            line vty 0 4
+             transport input all
+            !
+            """,
+        ),
+        (
+            # баннер с отступом внутри секции
+            Vendor.CISCO,
+            """
+            hostname test
+            !
+            line con 0
+             banner motd ^C
+             x
+            ^C
+             exec-timeout 0 0
+            !
+            """,
+        ),
+        (
+            # команды без аргументов: \s в regex совпадает с переводом строки
+            Vendor.HUAWEI,
+            """
+            sysname test
+            #
+             ntp-service
+             ftp
+            #
+             ntp-service
+             ftp server enable
+            #
+            interface gi0/0/0
+             description test
+             ftp
+            """,
+        ),
+    ],
+)
+def test_parse_stream_pre_run(tmp_path: Path, vendor: Vendor, config: str) -> None:
+    config = dedent(config).strip()
+    parser = CTreeParser(vendor=vendor)
+    expected = parser.parse(config)
+    root = parser.parse_stream(StringIO(config))
+    assert CTreeSerializer.to_dict(root) == CTreeSerializer.to_dict(expected)
+    assert root.config == expected.config
+
+    # файл с переводом строки в конце разбирается так же, как тот же текст
+    config_file = tmp_path / "config.txt"
+    config_file.write_text(config + "\n")
+    expected = parser.parse(config + "\n")
+    [root_str, root_path] = parser.parse_many([config + "\n", config_file], workers=1)
+    assert isinstance(root_str, CTree) and isinstance(root_path, CTree)
+    assert CTreeSerializer.to_dict(root_str) == CTreeSerializer.to_dict(expected)
+    assert CTreeSerializer.to_dict(root_path) == CTreeSerializer.to_dict(expected)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_many(tmp_path: Path, get_dict_loader: TaggingRules, workers: int) -> None:
+    parser = CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=get_dict_loader)
+    config_file = tmp_path / "huawei.txt"
+    config_file.write_text(huawei_config)
+    broken_config = "section\n  sub-section\n sub-line"
+    trees = parser.parse_many([huawei_config, broken_config, config_file, "sysname test"], workers=workers)
+    assert len(trees) == 4
+    expected = CTreeSerializer.to_dict(parser.parse(huawei_config))
+    assert isinstance(trees[0], CTree)
+    assert CTreeSerializer.to_dict(trees[0]) == expected
+    assert isinstance(trees[1], IndexError)
+    assert isinstance(trees[2], CTree)
+    assert CTreeSerializer.to_dict(trees[2]) == expected
+    assert isinstance(trees[3], CTree)
+    assert trees[3].config == "sysname test\n#"
+    assert parser.parse_many([], workers=workers) == []
+
+    # после вызова парсер (вместе с правилами) не остается в памяти процесса
+    # (исключения в результатах ссылаются на него через traceback, поэтому удаляются тоже)
+    parser_ref = weakref.ref(parser)
+    del parser, trees
+    gc.collect()
+    assert parser_ref() is None
+
+
 def test_file_rules_loader() -> None:
     loader1 = TaggingRulesFile(Path(__file__).with_suffix(".yaml"))
     loader2 = TaggingRulesFile(str(Path(__file__).with_suffix(".yaml")))
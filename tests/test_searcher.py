@@ -1,8 +1,25 @@
+import gc
+import weakref
 from textwrap import dedent
+from typing import Any
 
 import pytest
 
-from ctreepo import CTree, CTreeParser, CTreeSearcher, CTreeSerializer, TaggingRulesDict, Vendor
+from ctreepo import (
+    CTree,
+    CTreeArena,
+    CTreeEnv,
+    CTreeParser,
+    CTreeQuery,
+    CTreeSearcher,
+    CTreeSerializer,
+    HuaweiCT,
+    TaggingRulesDict,
+    TagRegistry,
+    TagSet,
+    Vendor,
+    iter_preorder,
+)
 
 config = dedent(
     """
@@ -610,3 +627,219 @@ def test_exclude_children_by_tag() -> None:
         exclude_tags=["rm-attach"],
     )
     assert bgp_no_rm_exclude.config == bgp_no_rm_exclude_str
+
+
+def test_tag_registry(get_config_tree: CTree) -> None:
+    registry = TagRegistry()
+    vpn = registry.register(["vpn"])
+    lan = registry.register(["LAN"])
+    assert vpn != lan
+    assert registry.register(["LAN", "vpn"]) == vpn | lan
+    assert registry.register([]) == 0
+    assert len(registry) == 2
+
+    # теги узлов, которых нет в запросах, битов не получают
+    assert registry.get_mask(["LAN", "vpn", "gi0/0/0"]) == vpn | lan
+    assert registry.get_mask(["gi0/0/0"]) == 0
+    assert len(registry) == 2
+
+    tags = TagSet.get(get_config_tree.children["ip vpn-instance LAN"].tags)
+    assert registry.get_mask(tags) == vpn | lan
+    # маска набора тегов учитывает теги, зарегистрированные позже
+    rd_tags = TagSet.get(
+        get_config_tree.children["ip vpn-instance LAN"]
+        .children["ipv4-family"]
+        .children["route-distinguisher 192.168.0.1:123"]
+        .tags
+    )
+    assert registry.get_mask(rd_tags) == lan
+    rd = registry.register(["rd"])
+    assert registry.get_mask(rd_tags) == lan | rd
+
+    # реестр не удерживает наборы тегов
+    temp_tags = TagSet.get(["temp-registry-tag", "vpn"])
+    assert registry.get_mask(temp_tags) == vpn
+    temp_ref = weakref.ref(temp_tags)
+    del temp_tags
+    gc.collect()
+    assert temp_ref() is None
+
+    # свой реестр дает тот же результат, что и общий
+    queries: list[dict[str, Any]] = [
+        {"include_tags": ["vpn", "rd"], "include_mode": "or"},
+        {"include_tags": ["vpn", "LAN"], "include_mode": "and"},
+        {"include_tags": ["vpn"], "exclude_tags": ["rd", "MGMT"]},
+        {"string": "address", "exclude_tags": ["interface-2"]},
+    ]
+    for kwargs in queries:
+        result = CTreeSearcher.search(get_config_tree, tag_registry=registry, **kwargs)
+        assert result == CTreeSearcher.search(get_config_tree, **kwargs)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"include_tags": ["vpn", "rd"], "include_mode": "or"},
+        {"include_tags": ["vpn", "LAN"], "include_mode": "and"},
+        {"include_tags": ["vpn"], "exclude_tags": ["rd", "MGMT"]},
+        {"include_tags": ["ip"], "include_children": True},
+        {"include_tags": ["vpn", "rd"], "include_children": True},
+        {"string": "route-distinguisher", "include_tags": ["rd", "interface"]},
+        {"string": "vpn-target", "include_tags": ["vpn", "rt"], "include_mode": "and"},
+        {"include_tags": ["not-found"]},
+        {"string": "address", "exclude_tags": ["interface-2"]},
+    ],
+)
+def test_tag_index(kwargs: dict[str, Any]) -> None:
+    tagging_rules_dict: dict[Vendor, list[dict[str, str | list[str]]]] = {
+        Vendor.HUAWEI: [
+            {"regex": r"^ip vpn-instance (\S+)$", "tags": ["vpn"]},
+            {"regex": r"^ip vpn-instance (\S+) .* export-extcommunity evpn", "tags": ["rt"]},
+            {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+            {"regex": r"^interface (\S+) .* ip address \S+ \S+$", "tags": ["ip"]},
+            {"regex": r"^ip vpn-instance (\S+) .* route-distinguisher (\S+)", "tags": ["rd"]},
+        ],
+    }
+    loader = TaggingRulesDict(tagging_rules_dict)
+    root = CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=loader).parse(config)
+    indexed = CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=loader, tag_index=True).parse(config)
+    assert root.tag_index is None
+    assert indexed.tag_index is not None
+    assert indexed.tag_index.is_valid
+
+    def check() -> None:
+        expected = CTreeSearcher.search(root, **kwargs)
+        result = CTreeSearcher.search(indexed, **kwargs)
+        assert result == expected
+        assert result.config == expected.config
+
+    check()
+
+    extra = "interface gi0/0/3\n ip address 1.1.1.1 255.255.255.252"
+    # любое изменение дерева сбрасывает индекс, он перестраивается при следующем поиске
+    for ct in (root, indexed):
+        ct.children["ip vpn-instance MGMT"].delete()
+        ct.children["ip vpn-instance LAN"].children["ipv4-family"].tags = ["rd", "LAN"]
+        HuaweiCT("interface gi0/0/2", ct, ["interface", "gi0/0/2"])
+        ct.merge(CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=loader).parse(extra))
+        ct.reorder(["interface"], reverse=True)
+    assert indexed.tag_index is not None
+    assert not indexed.tag_index.is_valid
+    check()
+    # без include_tags поиск идет обходом дерева, индекс не нужен
+    assert indexed.tag_index.is_valid == ("include_tags" in kwargs)
+
+    # изменения на месте: список тегов узла и словарь children
+    for ct in (root, indexed):
+        ct.children["ip vpn-instance LAN"].children["ipv4-family"].tags.append("interface")
+        ct.children["interface gi0/0/2"].tags.remove("interface")
+        ct.children["interface gi0/0/3"].children.clear()
+        del ct.children["ip vpn-instance LAN"].children["ipv4-family"].children["route-distinguisher 192.168.0.1:123"]
+    check()
+
+
+def test_tag_index_subtree() -> None:
+    tagging_rules: list[dict[str, str | list[str]]] = [{"regex": r"^ip vpn-instance (\S+)$", "tags": ["vpn"]}]
+    parser = CTreeParser(Vendor.HUAWEI, TaggingRulesDict({Vendor.HUAWEI: tagging_rules}), tag_index=True)
+    root = parser.parse(config)
+    index = root.tag_index
+    assert index is not None and index.is_valid
+    # индекс общий для всего дерева, любой узел сбрасывает его без подъема к корню
+    family = root.children["ip vpn-instance LAN"].children["ipv4-family"]
+    assert family.tag_index is index
+    family.tags = ["vpn"]
+    assert not index.is_valid
+    # номера узлов поддерева идут подряд, subtree_end - номер первого узла после поддерева
+    for rank, node in index.get("vpn"):
+        assert index.subtree_end(rank) - rank - 1 == sum(1 for _ in iter_preorder(node, include_root=False))
+
+    # перенесенное поддерево сбрасывает индексы обоих деревьев
+    other = parser.parse("ip vpn-instance OTHER")
+    other_index = other.tag_index
+    assert other_index is not None and other_index.is_valid
+    family.parent = other.children["ip vpn-instance OTHER"]
+    assert not index.is_valid
+    assert not other_index.is_valid
+
+    # удаленное поддерево индекс дерева не использует
+    vpn = root.children["ip vpn-instance MGMT"]
+    vpn.delete()
+    vpn.parent = None
+    assert vpn.tag_index is None
+    result = CTreeSearcher.search(vpn, include_tags=["vpn"])
+    assert result.config == vpn.config
+    assert vpn.enable_tag_index() is not index
+
+
+def test_search_many(get_config_tree: CTree) -> None:
+    queries: list[dict[str, Any]] = [
+        {"string": "ipv4-family"},
+        {"string": "ipv4-family", "include_children": True},
+        {"string": "vpn-instance", "exclude_tags": ["rt"]},
+        {"string": r"^ip vpn-instance (\S+)$", "include_tags": ["vpn"], "include_children": True},
+        {"string": "address|route-distinguisher"},
+        {"include_tags": ["vpn", "rd"], "include_mode": "or"},
+        {"include_tags": ["vpn", "LAN"], "include_mode": "and"},
+        {"include_tags": ["interface"], "include_children": True},
+        {"exclude_tags": ["interface", "vpn"]},
+        {"string": r"(\d+)\.\1"},
+        # условие на группу, в общем regex'e номер группы был бы другим
+        {"string": r"^(radius)? ?(?(1)-server|vxlan)"},
+        {"string": "not-found"},
+        {},
+    ]
+    expected = [CTreeSearcher.search(get_config_tree, **query) for query in queries]
+    result = CTreeSearcher.search_many(get_config_tree, queries)
+    assert result == expected
+    assert [ct.config for ct in result] == [ct.config for ct in expected]
+
+    views = CTreeSearcher.search_many(get_config_tree, queries, view=True)
+    assert [view.config for view in views] == [ct.config for ct in expected]
+
+    # поиск в поддереве
+    subtree = get_config_tree.children["ip vpn-instance LAN"]
+    expected = [CTreeSearcher.search(subtree, **query) for query in queries]
+    assert [ct.config for ct in CTreeSearcher.search_many(subtree, queries)] == [ct.config for ct in expected]
+
+    with pytest.raises(TypeError):
+        _ = CTreeSearcher.search_many(get_config_tree, [{"strng": "ipv4-family"}])
+
+
+def test_query(get_config_tree: CTree) -> None:
+    query = CTreeQuery.compile(" ipv4-family ", include_tags=["vpn", "rd"], exclude_tags=["MGMT"])
+    assert query.pattern is not None
+    assert query.pattern.pattern == "ipv4-family"
+    assert query.include_tags == frozenset(["vpn", "rd"])
+    assert query == CTreeQuery.compile("ipv4-family", include_tags=["rd", "vpn"], exclude_tags=["MGMT"])
+    assert len({query, CTreeQuery.compile("ipv4-family", include_tags=["rd", "vpn"], exclude_tags=["MGMT"])}) == 1
+    assert CTreeQuery.compile().is_empty
+    assert not query.is_empty
+    with pytest.raises(ValueError):
+        _ = CTreeQuery.compile("ipv4-family", include_mode="xor")  # type: ignore[arg-type]
+    with pytest.raises(TypeError):
+        _ = CTreeSearcher.search(get_config_tree, query, string="ipv4-family")
+
+    arena = CTreeArena.from_ctree(get_config_tree)
+    queries: list[dict[str, Any]] = [
+        {"string": "ipv4-family", "include_children": True},
+        {"string": "vpn-instance", "exclude_tags": ["rt"]},
+        {"include_tags": ["vpn", "LAN"], "include_mode": "and"},
+        {"include_tags": ["vpn", "rd"], "include_children": True},
+        {"string": "not-found"},
+        {},
+    ]
+    for kwargs in queries:
+        query = CTreeQuery.compile(**kwargs)
+        expected = CTreeSearcher.search(get_config_tree, **kwargs)
+        assert CTreeSearcher.search(get_config_tree, query) == expected
+        assert CTreeSearcher.search(get_config_tree, query, view=True).config == expected.config
+        assert CTreeSearcher.search(arena, query).config == expected.config
+
+    compiled = [CTreeQuery.compile(**kwargs) for kwargs in queries]
+    mixed: list[CTreeQuery | dict[str, Any]] = [*compiled[:3], *queries[3:]]
+    expected_many = CTreeSearcher.search_many(get_config_tree, queries)
+    assert CTreeSearcher.search_many(get_config_tree, mixed) == expected_many
+
+    env = CTreeEnv(Vendor.HUAWEI)
+    assert env.search(get_config_tree, compiled[0]) == expected_many[0]
+    assert env.search_many(get_config_tree, compiled) == expected_many
@@ -1,8 +1,11 @@
+import io
+import json
+import sys
 from textwrap import dedent
 
 import pytest
 
-from ctreepo import CTreeParser, CTreeSerializer, TaggingRules, TaggingRulesDict, Vendor
+from ctreepo import CTreeArena, CTreeEnv, CTreeParser, CTreeSerializer, HuaweiCT, TaggingRules, TaggingRulesDict, Vendor
 
 config = dedent(
     """
@@ -175,3 +178,89 @@ def test_from_dict(get_dict_loader: TaggingRules) -> None:
 
     root_from_dict = CTreeSerializer.from_dict(Vendor.HUAWEI, config_dict)
     assert root_from_config == root_from_dict
+
+
+def test_records(get_dict_loader: TaggingRules) -> None:
+    parser = CTreeParser(Vendor.HUAWEI, get_dict_loader)
+    root = parser.parse(config)
+    records = CTreeSerializer.to_records(root)
+    assert records[:4] == [
+        (0, "", []),
+        (1, "sflow collector 1 ip 100.64.0.1 vpn-instance MGMT", []),
+        (1, "storm suppression statistics enable", []),
+        (1, "ip vpn-instance MGMT", ["vpn", "MGMT"]),
+    ]
+    assert records[4] == (2, "ipv4-family", ["vpn", "MGMT"])
+    restored = CTreeSerializer.from_records(Vendor.HUAWEI, records)
+    assert restored == root
+    assert CTreeSerializer.to_dict(restored) == config_dict
+
+
+def test_dict_deep_tree() -> None:
+    depth = sys.getrecursionlimit() + 100
+    records = [(indx, f"section {indx}" if indx != 0 else "", ["deep"] if indx != 0 else []) for indx in range(depth)]
+    root = CTreeSerializer.from_records(Vendor.HUAWEI, records)
+    data = CTreeSerializer.to_dict(root)
+    restored = CTreeSerializer.from_dict(Vendor.HUAWEI, data)
+    assert restored == root
+    assert CTreeSerializer.to_records(restored) == records
+
+    # поддерево из словаря добавляется к parent
+    parent = HuaweiCT()
+    section = CTreeSerializer.from_dict(Vendor.HUAWEI, data["children"]["section 1"], parent)
+    assert section.parent is parent
+    assert parent.config == root.config
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_dump_load(get_dict_loader: TaggingRules, compression: str | None) -> None:
+    parser = CTreeParser(Vendor.HUAWEI, get_dict_loader)
+    root = parser.parse(config)
+    fp = io.BytesIO()
+    CTreeSerializer.dump(root, fp, compression=compression)  # type: ignore[arg-type]
+    assert not fp.closed
+    size = fp.tell()
+    assert size < len(json.dumps(config_dict))
+
+    fp.seek(0)
+    restored = CTreeSerializer.load(Vendor.HUAWEI, fp)
+    assert restored == root
+    assert CTreeSerializer.to_dict(restored) == config_dict
+    assert fp.tell() == size
+    # строки и наборы тегов общие для одинаковых значений
+    ipv4_family = [node.children["ipv4-family"] for node in restored.children.values() if "vpn" in node.tags]
+    assert ipv4_family[0].line is ipv4_family[1].line
+
+    # arena записывается в тот же формат
+    arena_fp = io.BytesIO()
+    CTreeSerializer.dump(CTreeArena.from_ctree(root), arena_fp, compression=compression)  # type: ignore[arg-type]
+    if compression is None:
+        assert arena_fp.getvalue() == fp.getvalue()
+    arena_fp.seek(0)
+    assert CTreeEnv(Vendor.HUAWEI).load(arena_fp) == root
+
+
+def test_dump_load_errors() -> None:
+    with pytest.raises(ValueError, match="unknown compression"):
+        CTreeSerializer.dump(HuaweiCT(), io.BytesIO(), compression="lzma")  # type: ignore[arg-type]
+    with pytest.raises(ValueError, match="not a CTree snapshot"):
+        CTreeSerializer.load(Vendor.HUAWEI, io.BytesIO(b"\x00" * 64))
+
+    fp = io.BytesIO()
+    CTreeSerializer.dump(HuaweiCT(), fp)
+    restored = CTreeSerializer.load(Vendor.HUAWEI, io.BytesIO(fp.getvalue()))
+    assert restored == HuaweiCT()
+    with pytest.raises(ValueError, match="truncated"):
+        CTreeSerializer.load(Vendor.HUAWEI, io.BytesIO(fp.getvalue()[:-1]))
+
+
+def test_dump_load_deep_tree() -> None:
+    depth = sys.getrecursionlimit() + 100
+    records = [(indx, f"section {indx}" if indx != 0 else "", ["deep"] if indx != 0 else []) for indx in range(depth)]
+    records.append((1, "last", []))
+    root = CTreeSerializer.from_records(Vendor.HUAWEI, records)
+    fp = io.BytesIO()
+    CTreeSerializer.dump(root, fp, compression="gzip")
+    fp.seek(0)
+    restored = CTreeSerializer.load(Vendor.HUAWEI, fp)
+    assert CTreeSerializer.to_records(restored) == records
@@ -0,0 +1,122 @@
+from pathlib import Path
+from textwrap import dedent
+
+import pytest
+
+from ctreepo import (
+    CTreeEnv,
+    CTreeSerializer,
+    CTreeSnapshot,
+    CTreeSnapshotNode,
+    HuaweiCT,
+    Vendor,
+)
+
+config = dedent(
+    """
+    sflow collector 1 ip 100.64.0.1 vpn-instance MGMT
+    #
+    ip vpn-instance MGMT
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+    #
+    ip vpn-instance LAN
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+      vpn-target 123:123 export-extcommunity evpn
+      vpn-target 123:123 import-extcommunity evpn
+     vxlan vni 123
+    #
+    interface gi0/0/0
+     ip address 1.1.1.1 255.255.255.252
+    #
+    interface gi0/0/1
+     ip address 1.1.1.1 255.255.255.252
+    #
+    radius-server template RADIUS_TEMPLATE
+     radius-server shared-key cipher secret_password
+     radius-server algorithm loading-share
+    #
+    """
+).strip()
+
+
+@pytest.fixture(scope="session")
+def get_env() -> CTreeEnv:
+    tagging_rules: list[dict[str, str | list[str]]] = [
+        {"regex": r"^ip vpn-instance (\S+)$", "tags": ["vpn"]},
+        {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+        {"regex": r"^interface (gi0/0/0) .* ip address \S+ \S+$", "tags": ["ip", "interface-1"]},
+    ]
+    return CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules)
+
+
+def test_lazy_loading(get_env: CTreeEnv, tmp_path: Path) -> None:
+    root = get_env.parse(config)
+    path = tmp_path / "snapshot.ctree"
+    with open(path, "wb") as fp:
+        get_env.dump(root, fp)
+
+    with get_env.open_snapshot(path) as snapshot:
+        assert len(snapshot) == 18
+        assert snapshot._strings.count(None) == len(snapshot._strings)
+        vpn = snapshot.root.children["ip vpn-instance LAN"]
+        assert vpn.children is vpn.children
+        # декодированы только строки потомков корня и потомков секции
+        assert len(snapshot._strings) - snapshot._strings.count(None) == 8
+
+        rd = vpn.children["ipv4-family"].children["route-distinguisher 192.168.0.1:123"]
+        assert isinstance(rd, CTreeSnapshotNode)
+        assert rd.tags == ["vpn", "LAN"]
+        assert rd.formal_path == "ip vpn-instance LAN / ipv4-family / route-distinguisher 192.168.0.1:123"
+        assert rd.parent is not None and rd.parent.parent == vpn
+        assert vpn.config == root.children["ip vpn-instance LAN"].config
+        assert vpn.patch == root.children["ip vpn-instance LAN"].patch
+        assert vpn.materialize() == root.children["ip vpn-instance LAN"].copy()
+        ct_rd = root.children["ip vpn-instance LAN"].children["ipv4-family"].children[rd.line]
+        assert rd.materialize(children=False) == ct_rd.copy(children=False)
+        radius = snapshot.root.children["radius-server template RADIUS_TEMPLATE"]
+        assert radius.masked_config == root.children["radius-server template RADIUS_TEMPLATE"].masked_config
+
+        assert snapshot.root.config == root.config
+        assert snapshot.root.patch == root.patch
+        assert snapshot.root.materialize() == root
+        assert snapshot.to_ctree() == root
+        assert snapshot._strings.count(None) == 0
+
+
+def test_snapshot_errors(get_env: CTreeEnv, tmp_path: Path) -> None:
+    root = get_env.parse(config)
+    path = tmp_path / "snapshot.ctree.gz"
+    with open(path, "wb") as fp:
+        get_env.dump(root, fp, compression="gzip")
+    with pytest.raises(ValueError, match="compressed"):
+        _ = get_env.open_snapshot(path)
+
+    with open(path, "wb") as fp:
+        get_env.dump(root, fp)
+    data = path.read_bytes()
+    with pytest.raises(ValueError, match="truncated"):
+        _ = CTreeSnapshot(HuaweiCT, data[:-4])
+
+    snapshot = CTreeSnapshot(HuaweiCT, data)
+    interface = snapshot.root.children["interface gi0/0/0"]
+    assert interface.tags == ["interface", "gi0/0/0"]
+    snapshot.close()
+    with pytest.raises(ValueError):
+        _ = interface.children
+
+
+def test_snapshot_deep_tree(tmp_path: Path) -> None:
+    records: list[tuple[int, str, list[str]]] = [(0, "", [])]
+    records.extend((indx, f"section {indx}", []) for indx in range(1, 2000))
+    root = CTreeSerializer.from_records(Vendor.HUAWEI, records)
+    path = tmp_path / "snapshot.ctree"
+    with open(path, "wb") as fp:
+        CTreeSerializer.dump(root, fp)
+    with CTreeSnapshot.open(Vendor.HUAWEI, path) as snapshot:
+        node = snapshot.root
+        while len(node.children) != 0:
+            node = next(iter(node.children.values()))
+        assert node.line == "section 1999"
+        assert snapshot.to_ctree() == root
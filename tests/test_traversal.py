@@ -0,0 +1,95 @@
+import sys
+from textwrap import dedent
+
+from ctreepo import CTree, CTreeDiffer, CTreeParser, CTreeSerializer, HuaweiCT, Vendor, iter_postorder, iter_preorder
+
+config = dedent(
+    """
+    interface gi0/0/0
+     description uplink
+     ip address 1.1.1.1 255.255.255.252
+    #
+    xpl route-filter RP_XPL_BLOCK
+     if ip route-destination in PL_DEFAULT then
+      drop
+     endif
+     end-filter
+    #
+    """
+).strip()
+
+
+def get_deep_tree(depth: int, line: str = "section") -> CTree:
+    root = HuaweiCT()
+    node = root
+    for indx in range(depth):
+        node = HuaweiCT(f"{line} {indx}", node, ["deep"])
+    return root
+
+
+def test_order() -> None:
+    root = CTreeParser(vendor=Vendor.HUAWEI).parse(config)
+    preorder = [(node.line, depth) for node, depth in iter_preorder(root)]
+    assert preorder == [(line, depth) for depth, line, _ in CTreeSerializer.to_records(root)]
+    assert [line for line, _ in preorder[:4]] == [
+        "",
+        "interface gi0/0/0",
+        "description uplink",
+        "ip address 1.1.1.1 255.255.255.252",
+    ]
+    assert [node.line for node, _ in iter_preorder(root, include_root=False)] == [line for line, _ in preorder[1:]]
+
+    postorder = [node.line for node in iter_postorder(root)]
+    assert postorder == [
+        "description uplink",
+        "ip address 1.1.1.1 255.255.255.252",
+        "interface gi0/0/0",
+        "drop",
+        "if ip route-destination in PL_DEFAULT then",
+        "endif",
+        "end-filter",
+        "xpl route-filter RP_XPL_BLOCK",
+        "",
+    ]
+    assert [node.line for node in iter_postorder(root, include_root=False)] == postorder[:-1]
+
+    # выданные узлы можно удалять при обходе снизу вверх
+    for node in iter_postorder(root, include_root=False):
+        node.delete()
+    assert len(root.children) == 0
+
+
+def test_deep_tree() -> None:
+    depth = sys.getrecursionlimit() + 100
+    root = get_deep_tree(depth)
+    leaf = root
+    while len(leaf.children) != 0:
+        leaf = next(iter(leaf.children.values()))
+
+    assert len(list(iter_preorder(root))) == depth + 1
+    assert len(list(iter_postorder(root))) == depth + 1
+    assert leaf.formal_path.count(" / ") == depth - 1
+    assert len(root.config.splitlines()) == depth + 1
+    assert len(root.patch.splitlines()) > depth
+
+    copy = root.copy()
+    assert copy == root
+    assert len(leaf.copy(children=False).formal_config.split(" / ")) == depth
+    assert root.formal_config == leaf.formal_path
+
+    other = get_deep_tree(depth)
+    other.merge(get_deep_tree(depth, line="other"))
+    assert other != root
+    assert len(other.children) == 2
+    assert other.subtract(root).config == get_deep_tree(depth, line="other").config
+    assert len(root.apply(other).children) == 2
+    assert len(root.apply_view(other).children) == 2
+
+    diff = CTreeDiffer.diff(root, other)
+    assert diff.patch.count("section") == 0
+    assert len(diff.children) == 1
+
+    root.rebuild(deep=True)
+    root.reorder(["deep"])
+    assert root == copy
+    assert CTreeSerializer.from_records(Vendor.HUAWEI, CTreeSerializer.to_records(root)) == root
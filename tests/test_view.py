@@ -0,0 +1,117 @@
+from textwrap import dedent
+from typing import Any
+
+import pytest
+
+from ctreepo import CTree, CTreeEnv, CTreeParser, CTreeSearcher, CTreeView, TaggingRulesDict, Vendor
+
+config = dedent(
+    """
+    sflow collector 1 ip 100.64.0.1 vpn-instance MGMT
+    #
+    ip vpn-instance MGMT
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+    #
+    ip vpn-instance LAN
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+      vpn-target 123:123 export-extcommunity evpn
+      vpn-target 123:123 import-extcommunity evpn
+     vxlan vni 123
+    #
+    interface gi0/0/0
+     ip address 1.1.1.1 255.255.255.252
+    #
+    interface gi0/0/1
+     ip address 1.1.1.1 255.255.255.252
+    #
+    radius-server template RADIUS_TEMPLATE
+     radius-server shared-key cipher secret_password
+     radius-server algorithm loading-share
+    #
+    """
+).strip()
+
+tagging_rules_dict: dict[Vendor, list[dict[str, str | list[str]]]] = {
+    Vendor.HUAWEI: [
+        {"regex": r"^ip vpn-instance (\S+)$", "tags": ["vpn"]},
+        {"regex": r"^ip vpn-instance (\S+) .* export-extcommunity evpn", "tags": ["rt"]},
+        {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+        {"regex": r"^interface (\S+) .* ip address \S+ \S+$", "tags": ["ip"]},
+    ],
+}
+
+
+@pytest.fixture(scope="session")
+def get_config_tree() -> CTree:
+    parser = CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=TaggingRulesDict(tagging_rules_dict))
+    return parser.parse(config)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"string": "ipv4-family"},
+        {"string": "ipv4-family", "include_children": True},
+        {"string": "vpn", "include_children": True},
+        {"string": "vpn-instance", "exclude_tags": ["rt"]},
+        {"include_tags": ["vpn", "ip"]},
+        {"include_tags": ["interface", "ip"], "include_mode": "and", "include_children": True},
+        {"exclude_tags": ["vpn"], "include_children": True},
+        {"string": "not-found"},
+        {},
+    ],
+)
+def test_view(get_config_tree: CTree, kwargs: dict[str, Any]) -> None:
+    expected = CTreeSearcher.search(get_config_tree, **kwargs)
+    view = CTreeSearcher.search(get_config_tree, view=True, **kwargs)
+    assert isinstance(view, CTreeView)
+    assert view.config == expected.config
+    assert view.masked_config == expected.masked_config
+    assert view.patch == expected.patch
+    assert view.materialize() == expected
+    assert view.materialize().config == expected.config
+
+    stack: list[tuple[CTreeView, CTree]] = [(view, expected)]
+    while len(stack) > 0:
+        view_node, node = stack.pop()
+        assert view_node.line == node.line
+        assert view_node.formal_path == node.formal_path
+        assert view_node.config == node.config
+        assert view_node.materialize().config == node.copy().config
+        assert list(view_node.children) == list(node.children)
+        stack.extend(zip(view_node.children.values(), node.children.values(), strict=True))
+
+
+def test_view_shares_nodes(get_config_tree: CTree) -> None:
+    view = CTreeSearcher.search(get_config_tree, string="route-distinguisher", view=True)
+    lan = view.children["ip vpn-instance LAN"]
+    assert lan.node is get_config_tree.children["ip vpn-instance LAN"]
+    assert list(lan.children["ipv4-family"].children) == ["route-distinguisher 192.168.0.1:123"]
+    assert lan.parent is not None
+    assert lan.parent.node is get_config_tree
+
+    full = CTreeSearcher.search(get_config_tree, string="ip vpn-instance LAN", include_children=True, view=True)
+    family = full.children["ip vpn-instance LAN"].children["ipv4-family"]
+    assert family.parent is not None
+    assert family.parent.config == full.children["ip vpn-instance LAN"].config
+
+    # при поиске в поддереве путь до корня сохраняется, как и при copy()
+    subtree = get_config_tree.children["ip vpn-instance LAN"]
+    expected = CTreeSearcher.search(subtree, string="vpn-target")
+    assert CTreeSearcher.search(subtree, string="vpn-target", view=True).config == expected.config
+
+    # materialize возвращает независимую копию
+    copy = view.materialize()
+    copy.children["ip vpn-instance LAN"].delete()
+    assert "ip vpn-instance LAN" in view.children
+
+
+def test_env_view() -> None:
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules_dict[Vendor.HUAWEI], tag_index=True)
+    root = env.parse(config)
+    view = env.search(root, include_tags=["ip"], view=True)
+    assert view.config == env.search(root, include_tags=["ip"]).config
+    with pytest.raises(TypeError):
+        _ = env.search(env.parse_arena(config), include_tags=["ip"], view=True)  # type: ignore[call-overload]